@@ -6,4 +6,5 @@ setup(
     install_requires = ['pandas', 'ast'],
     packages = ['checkLspace'],
     package_dir = {'checkLspace':'src'},
+    package_data = {'checkLspace':['QHSolidTori.csv.bz2']},
 )
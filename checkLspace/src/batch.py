@@ -0,0 +1,224 @@
+"""
+Certifying many manifolds with is_certified_L_space, without babysitting
+notebooks.  Example, from this directory::
+
+  sage -python batch.py --census "CubicalOrientableClosedCensus(betti=0)" \\
+      --indices 0,2,8-15 --processes 8 --time-limit 3600 --memory-limit 4000 \\
+      --results results.jsonl
+
+Each manifold is certified in its own process group, with a wall-clock
+and a memory budget; on timeout the whole group is killed, including the
+processes forked by the parallel modes.  The memory limit applies to each
+process, hence with a portfolio it is divided among the strategies
+running at the same time.  One JSON line per manifold is appended to the results
+file as soon as it is done, so running the same command again after a
+crash resumes the sweep where it stopped.
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import signal
+import argparse
+import resource
+import traceback
+import multiprocessing
+from multiprocessing.connection import wait
+
+import snappy
+from check_if_is_L_space import is_certified_L_space, is_certified_L_space_portfolio, default_portfolio
+
+_context = multiprocessing.get_context('fork')
+
+
+def parse_indices(string):
+    """
+    >>> parse_indices('0,2,8-11,28')
+    [0, 2, 8, 9, 10, 11, 28]
+    """
+    ans = []
+    for part in string.split(','):
+        if '-' in part:
+            a, b = part.split('-')
+            ans += list(range(int(a), int(b) + 1))
+        else:
+            ans.append(int(part))
+    return ans
+
+
+def jobs_from_args(args):
+    #Returns a list of pairs (key, function returning the manifold); the key identifies the job in the results file
+    jobs = []
+    if args.census is not None:
+        census = eval(args.census, vars(snappy))
+        indices = parse_indices(args.indices) if args.indices else range(len(census))
+        for i in indices:
+            jobs.append(('%s[%d]' % (args.census, i), lambda i=i: census[i]))
+    for spec in args.specs:
+        jobs.append((spec, lambda spec=spec: snappy.Manifold(spec)))
+    return jobs
+
+
+def read_results(path):
+    #The keys of the jobs already done, read from the results file
+    done = set()
+    if os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                try:
+                    done.add(json.loads(line)['key'])
+                except ValueError:
+                    #A line truncated by a crash
+                    pass
+    return done
+
+
+def run_job(conn, key, get_manifold, kwargs, memory_limit, log_dir, portfolio=None, portfolio_processes=None):
+    #This runs in the child process, which leads its own process group so that it can be killed with its children
+    os.setsid()
+    if memory_limit is not None:
+        limit = memory_limit*1024*1024
+        if portfolio is not None:
+            limit = limit//min(len(portfolio), portfolio_processes or len(portfolio))
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if log_dir is not None:
+        sys.stdout = open(os.path.join(log_dir, key.replace('/', '_') + '.log'), 'w')
+    else:
+        sys.stdout = io.StringIO()
+    ans = {'key': key}
+    try:
+        M = get_manifold()
+        if portfolio is None:
+            ans['result'] = bool(is_certified_L_space(M, **kwargs))
+        else:
+            ans['result'] = bool(is_certified_L_space_portfolio(M, portfolio, processes=portfolio_processes, **kwargs))
+    except MemoryError:
+        ans['result'] = 'memory'
+    except Exception as e:
+        ans['result'] = 'error'
+        ans['message'] = repr(e)
+        print(traceback.format_exc())
+    sys.stdout.flush()
+    conn.send(ans)
+    conn.close()
+
+
+def kill_job(P):
+    #Kills the process P of a job and all the processes it forked
+    try:
+        os.killpg(P.pid, signal.SIGKILL)
+    except OSError:
+        #The group is already gone
+        pass
+    P.join()
+
+
+def run_batch(jobs, results, processes=1, time_limit=None, memory_limit=None, log_dir=None, portfolio=None,
+              portfolio_processes=None, **kwargs):
+    """
+    Runs is_certified_L_space(M, **kwargs) on the manifolds of the given
+    jobs, at most processes at a time.  The jobs whose key is already in
+    the results file are skipped.  The time_limit is in seconds and the
+    memory_limit in megabytes.  If portfolio is a list of strategies, each
+    manifold is certified by is_certified_L_space_portfolio, running at
+    most portfolio_processes strategies at a time.
+    """
+    done = read_results(results)
+    todo = [job for job in jobs if job[0] not in done]
+    print('%d jobs, %d already done.' % (len(jobs), len(jobs) - len(todo)))
+    if log_dir is not None and not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+
+    running = dict()
+    with open(results, 'a') as out:
+        def write(ans):
+            out.write(json.dumps(ans) + '\n')
+            out.flush()
+            print('%s: %s (%.1fs)' % (ans['key'], ans['result'], ans['time']))
+
+        while todo or running:
+            while todo and len(running) < processes:
+                key, get_manifold = todo.pop(0)
+                receiver, sender = _context.Pipe(duplex=False)
+                P = _context.Process(target=run_job, args=(sender, key, get_manifold, kwargs, memory_limit, log_dir,
+                                                           portfolio, portfolio_processes))
+                P.start()
+                sender.close()
+                running[receiver] = (key, P, time.time())
+
+            for conn in wait(list(running), timeout=1):
+                key, P, start = running.pop(conn)
+                try:
+                    ans = conn.recv()
+                except EOFError:
+                    #The process died, e.g. killed by the kernel when out of memory
+                    ans = {'key': key, 'result': 'crashed'}
+                ans['time'] = time.time() - start
+                kill_job(P)
+                conn.close()
+                write(ans)
+
+            if time_limit is not None:
+                now = time.time()
+                for conn, (key, P, start) in list(running.items()):
+                    if now - start > time_limit:
+                        kill_job(P)
+                        conn.close()
+                        del running[conn]
+                        write({'key': key, 'result': 'timeout', 'time': now - start})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Certify that many manifolds are L-spaces.')
+    parser.add_argument('specs', nargs='*', help='SnapPy specifications of manifolds (e.g. "m004(1,2)" or a .tri file)')
+    parser.add_argument('--census', help='a SnapPy census, e.g. "CubicalOrientableClosedCensus(betti=0)"')
+    parser.add_argument('--indices', help='indices in the census, e.g. "0,2,8-11" (default: all)')
+    parser.add_argument('--results', default='results.jsonl', help='the results file, one JSON line per manifold')
+    parser.add_argument('--log-dir', help='directory where the output of each certification is saved')
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--time-limit', type=float, help='seconds per manifold')
+    parser.add_argument('--memory-limit', type=int, help='megabytes per manifold')
+    parser.add_argument('--max-iter', type=int, default=25)
+    parser.add_argument('--max-coefficient', type=int, default=17)
+    parser.add_argument('--max-segms', type=int, default=6)
+    parser.add_argument('--max-drills', type=int, default=10)
+    parser.add_argument('--curves-to-avoid', type=int, default=-1)
+    parser.add_argument('--store', help='the store of L-space values shared between runs (see store.py)')
+    parser.add_argument('--volume-prefilter', action='store_true', help='fill the slopes by increasing length on the cusp')
+    parser.add_argument('--fill-processes', type=int, default=1, help='processes computing the fillings of each T')
+    parser.add_argument('--filling-cache', help='the cache of the evaluations of the fillings (see store.py)')
+    parser.add_argument('--portfolio', nargs='?', const='default',
+                        help='race several strategies for each manifold: a JSON list of changes of the parameters '
+                             '(default: the default portfolio of check_if_is_L_space.py)')
+    parser.add_argument('--portfolio-processes', type=int,
+                        help='strategies of the portfolio running at the same time (default: all of them)')
+    parser.add_argument('--drilling-cache', help='the cache of the drillings of the curves (see store.py)')
+    parser.add_argument('--lazy-drillings', action='store_true', help='drill the curves only until a usable T is found')
+    parser.add_argument('--rank-by-length', action='store_true', help='drill the short geodesics, by increasing length')
+    parser.add_argument('--no-alexander-prefilter', dest='alexander_prefilter', action='store_false',
+                        help='compute the Turaev torsion of all the drillings')
+    parser.add_argument('--refutation-time', type=float,
+                        help='seconds spent searching for a taut foliation of each filling before certifying it')
+    parser.add_argument('--persistent-foliation-tries', type=int,
+                        help='discard the fillings foliated by a persistently foliar orientation of T, trying this many retriangulations')
+    args = parser.parse_args(argv)
+
+    kwargs = dict(max_iter=args.max_iter, max_coefficient=args.max_coefficient, max_segms=args.max_segms,
+                  max_drills=args.max_drills, curves_to_avoid=args.curves_to_avoid, store=args.store,
+                  volume_prefilter=args.volume_prefilter, fill_processes=args.fill_processes,
+                  filling_cache=args.filling_cache, lazy_drillings=args.lazy_drillings,
+                  rank_by_length=args.rank_by_length, alexander_prefilter=args.alexander_prefilter,
+                  drilling_cache=args.drilling_cache, refutation_time=args.refutation_time,
+                  persistent_foliation_tries=args.persistent_foliation_tries)
+    portfolio = None
+    if args.portfolio is not None:
+        portfolio = default_portfolio if args.portfolio == 'default' else json.loads(args.portfolio)
+    run_batch(jobs_from_args(args), args.results, processes=args.processes, time_limit=args.time_limit,
+              memory_limit=args.memory_limit, log_dir=args.log_dir, portfolio=portfolio,
+              portfolio_processes=args.portfolio_processes, **kwargs)
+
+
+if __name__ == '__main__':
+    main()
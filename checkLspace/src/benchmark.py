@@ -0,0 +1,156 @@
+"""
+Benchmarks of is_certified_L_space on the proofs of the notebook
+CubicalOrientableClosedCensus/Notebook_proofs_rightangleddodman.ipynb,
+with the same parameters.  From this directory::
+
+  sage -python benchmark.py --output bench.json
+  sage -python benchmark.py --output new.json --baseline bench.json
+
+Each proof runs in its own process, and we record its result, the wall
+time, the peak resident memory (of the process or of one of the processes
+it forked), the number of fillings, drillings and Turaev torsions
+computed and the depth of the recursion.  With
+--baseline, the results are compared with a previous output, and the
+exit status is 1 if some proof changed its result or got slower (or
+bigger) than the tolerance allows.  Extra arguments of
+is_certified_L_space can be given as JSON with --kwargs, e.g.
+--kwargs '{"lazy_drillings": true}'.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import multiprocessing
+
+import snappy
+import check_if_is_L_space
+from check_if_is_L_space import is_certified_L_space
+
+_context = multiprocessing.get_context('fork')
+
+notebook_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'CubicalOrientableClosedCensus')
+
+
+def dodecahedral_manifold(index):
+    return snappy.CubicalOrientableClosedCensus(betti=0)[index]
+
+
+def filling_of_QHT_used_for_28(slope):
+    #RA_dod_28 is T(1,0), and it is an L-space since T(1,-1) and T(0,1) are (see the notebook)
+    T = snappy.Manifold(os.path.join(notebook_dir, 'QHT_USED_FOR_28.tri'))
+    T.dehn_fill(slope)
+    return T
+
+
+#The name, the manifold and the parameters of each proof of the notebook
+cases = [('RA_dod_0', lambda: dodecahedral_manifold(0), {}),
+         ('RA_dod_2', lambda: dodecahedral_manifold(2), {}),
+         ('RA_dod_8', lambda: dodecahedral_manifold(8), {}),
+         ('RA_dod_11', lambda: dodecahedral_manifold(11), {'curves_to_avoid': 5}),
+         ('RA_dod_15', lambda: dodecahedral_manifold(15), {}),
+         ('RA_dod_28_FillingA', lambda: filling_of_QHT_used_for_28((1, -1)), {'curves_to_avoid': 8}),
+         ('RA_dod_28_FillingB', lambda: filling_of_QHT_used_for_28((0, 1)), {})]
+
+
+def run_case(conn, get_manifold, kwargs, seed):
+    #This runs in the child process
+    random.seed(seed)
+    sys.stdout = io.StringIO()
+    for key in check_if_is_L_space.work_done:
+        check_if_is_L_space.work_done[key] = 0
+    ans = dict()
+    start = time.time()
+    try:
+        ans['result'] = bool(is_certified_L_space(get_manifold(), **kwargs))
+    except Exception as e:
+        ans['result'] = 'error'
+        ans['message'] = repr(e)
+    ans['time'] = time.time() - start
+    #On Linux, ru_maxrss is in kilobytes; the processes forked by the parallel modes are counted among the children
+    peak = max(resource.getrusage(who).ru_maxrss for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN])
+    ans['peak_rss_mb'] = peak/1024.0
+    ans.update(check_if_is_L_space.work_done)
+    conn.send(ans)
+    conn.close()
+
+
+def run_benchmarks(names=None, seed=0, **kwargs):
+    """
+    Runs the proofs with the given names (default: all of them) and
+    returns a dictionary from their names to their measurements.
+    """
+    ans = dict()
+    for name, get_manifold, case_kwargs in cases:
+        if names is not None and name not in names:
+            continue
+        receiver, sender = _context.Pipe(duplex=False)
+        P = _context.Process(target=run_case, args=(sender, get_manifold, dict(case_kwargs, **kwargs), seed))
+        P.start()
+        sender.close()
+        try:
+            ans[name] = receiver.recv()
+        except EOFError:
+            ans[name] = {'result': 'crashed'}
+        P.join()
+        print('%s: %s' % (name, ans[name]))
+    return ans
+
+
+def compare_with_baseline(results, baseline, tolerance=1.25):
+    """
+    Prints the ratios of the measurements to the ones of the baseline, and
+    returns the list of the regressions: the proofs whose result changed
+    or whose time or memory grew more than the tolerance.
+    """
+    regressions = []
+    keys = ['time', 'peak_rss_mb', 'fillings', 'drillings', 'torsions', 'max_depth']
+    print('%-20s %8s ' % ('proof', 'result') + ' '.join('%11s' % key for key in keys))
+    for name, new in sorted(results.items()):
+        old = baseline.get(name)
+        if old is None:
+            continue
+        ratios = []
+        for key in keys:
+            if key in new and key in old and old[key]:
+                ratios.append(new[key]/float(old[key]))
+            else:
+                ratios.append(None)
+        print('%-20s %8s ' % (name, new['result']) + ' '.join('%11s' % ('-' if r is None else '%.2fx' % r) for r in ratios))
+        if new['result'] != old['result']:
+            regressions.append((name, 'result', old['result'], new['result']))
+        for key, r in zip(keys[:2], ratios[:2]):
+            if r is not None and r > tolerance:
+                regressions.append((name, key, old[key], new[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the proofs of the right-angled dodecahedral manifolds.')
+    parser.add_argument('--cases', help='comma separated names of the proofs to run (default: all)')
+    parser.add_argument('--output', default='benchmark.json', help='where the measurements are saved')
+    parser.add_argument('--baseline', help='a previous output to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='the allowed ratio of time and memory')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--kwargs', default='{}', help='more arguments of is_certified_L_space, as JSON')
+    args = parser.parse_args(argv)
+
+    names = args.cases.split(',') if args.cases else None
+    results = run_benchmarks(names, seed=args.seed, **json.loads(args.kwargs))
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=1, sort_keys=True)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare_with_baseline(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print('Regression in %s: %s was %s, now %s' % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""
+A best-first version of is_certified_L_space.
+
+The recursive algorithm explores the proof tree depth first, so it can
+spend all its time in a deep branch while a sibling would have been
+closed quickly by a census hit.  Here the manifolds still to be proved
+to be L-spaces form a frontier, ordered by a cost estimate (by default
+the volume), and the cheapest one is expanded first.  Expanding a
+manifold M means drilling it to a Floer simple T, as is_certified_L_space
+does, and for each possible L-space interval of T finding the two
+fillings of minimal volume: M is an L-space if, for some interval, both
+fillings are.  The search is an AND/OR tree, and it stops as soon as the
+value of the root is known or the budget of fillings, Turaev torsions or
+expansions is exhausted.
+
+The whole state of the search (the tree and the frontier) is JSON, so an
+interrupted search can be saved and resumed::
+
+  S = ProofSearch(M)
+  S.run(max_fillings=10000, path='search.json')
+  ...
+  S = ProofSearch.load('search.json')
+  S.run(max_fillings=10000, path='search.json')
+  S.certificate().save('proof.json')
+
+The certificate has the same format as the one of is_certified_L_space
+(see certificate.py).
+"""
+
+import json
+import heapq
+from turaev import IotaInverseDtau
+from certificate import Certificate, manifold_description, manifold_from_description, filling_description
+from store import as_L_space_store, as_filling_cache, as_drilling_cache
+from check_if_is_L_space import (is_hyperbolic, set_allowed_solution_type, search_in_census_if_L_space,
+                                 find_drilling, search_for_minimal_volume_fillings, man_inv, man_inv_index,
+                                 census_identification, work_done)
+
+
+class ProofSearch(object):
+    """
+    The AND/OR tree of a best-first search of a proof that a manifold is
+    an L-space.  Each node is a dictionary with keys
+
+    * "manifold", "depth", "volume": the manifold (see certificate.py),
+      its depth in the tree and its volume;
+    * "value": True or False if the node was closed without expanding
+      it (by the census, the store or a failure), else None;
+    * "census", "store", "reason": why the node was closed;
+    * "options": None if the node was not expanded, else a list of
+      options, each a dictionary with keys "T", "Dtau", "slopes" and
+      "children" (as the drilling nodes of a certificate);
+    * "parent": None for the root, else the id of the parent node.
+
+    The node ids follow the names of the nodes of is_certified_L_space.
+    """
+    def __init__(self, M=None, max_iter=25, max_coefficient=17, max_segms=6, max_drills=10, curves_to_avoid=-1,
+                 only_true_hyperbolic_structures=False, priority='volume', store=None, filling_cache=None,
+                 volume_prefilter=False, fill_processes=1, lazy_drillings=False, rank_by_length=False,
+                 alexander_prefilter=True, drilling_cache=None):
+        assert priority in ['volume', 'depth']
+        self.options = dict(max_iter=max_iter, max_coefficient=max_coefficient, max_segms=max_segms,
+                            max_drills=max_drills, curves_to_avoid=curves_to_avoid,
+                            only_true_hyperbolic_structures=only_true_hyperbolic_structures, priority=priority,
+                            store=store, filling_cache=filling_cache, volume_prefilter=volume_prefilter,
+                            fill_processes=fill_processes, lazy_drillings=lazy_drillings,
+                            rank_by_length=rank_by_length, alexander_prefilter=alexander_prefilter,
+                            drilling_cache=drilling_cache)
+        self.nodes = dict()
+        self.frontier = []
+        self.work = {'fillings': 0, 'torsions': 0, 'expansions': 0}
+        self.invariants = []
+        self.root = None
+        self._manifolds = dict()
+        if M is not None:
+            self.root = 'M'
+            self._add_node('M', M, 0, None)
+
+    # The tree
+
+    def _add_node(self, node_id, M, depth, parent):
+        self.nodes[node_id] = {'manifold': manifold_description(M), 'depth': depth, 'volume': float(M.volume()),
+                               'value': None, 'options': None, 'parent': parent}
+        self._manifolds[node_id] = M
+        self._push(node_id)
+
+    def _add_closed_node(self, node_id, desc, depth, parent, value, **info):
+        node = {'manifold': desc, 'depth': depth, 'volume': None, 'value': value, 'options': None, 'parent': parent}
+        node.update(info)
+        self.nodes[node_id] = node
+
+    def _push(self, node_id):
+        node = self.nodes[node_id]
+        if self.options['priority'] == 'volume':
+            key = [node['volume'], node['depth']]
+        else:
+            key = [node['depth'], node['volume']]
+        heapq.heappush(self.frontier, key + [node_id])
+
+    def value(self, node_id=None):
+        #True or False if the value of the node is known, else None
+        node = self.nodes[self.root if node_id is None else node_id]
+        if node['value'] is not None or node['options'] is None:
+            return node['value']
+        values = [self._option_value(option) for option in node['options']]
+        if True in values:
+            return True
+        if all(v is False for v in values):
+            return False
+        return None
+
+    def _option_value(self, option):
+        if 'failed' in option:
+            return False
+        values = [self.value(child) for child in option['children']]
+        if False in values:
+            return False
+        if all(v is True for v in values):
+            return True
+        return None
+
+    def _is_relevant(self, node_id):
+        #An open node matters only if all its ancestors are open, and so are the options of its ancestors (including
+        #the node itself) under their parents: e.g. if a sibling of the node is False, the node can not change the value
+        while node_id is not None:
+            if self.value(node_id) is not None:
+                return False
+            parent = self.nodes[node_id]['parent']
+            if parent is not None:
+                for option in self.nodes[parent]['options'] or []:
+                    if node_id in option['children'] and self._option_value(option) is not None:
+                        return False
+            node_id = parent
+        return True
+
+    def _manifold(self, node_id):
+        if node_id not in self._manifolds:
+            self._manifolds[node_id] = manifold_from_description(self.nodes[node_id]['manifold'])
+        return self._manifolds[node_id]
+
+    # The search
+
+    def _close(self, node_id, value, **info):
+        self.nodes[node_id]['value'] = value
+        self.nodes[node_id].update(info)
+        self._manifolds.pop(node_id, None)
+
+    def expand(self, node_id):
+        """
+        Expands the given node, as a call of is_certified_L_space would.
+        """
+        node = self.nodes[node_id]
+        init_string = node_id[1:]
+        inv = man_inv_index([man_inv(volume=v, homology=h) for v, h in self.invariants])
+        Man = self._manifold(node_id)
+        store = as_L_space_store(self.options['store'])
+        self.work['expansions'] += 1
+
+        if node['depth'] > self.options['max_iter']:
+            print("Maximal depth reached; try raising max_iter")
+            return self._close(node_id, False, reason='depth')
+        if node_id == self.root:
+            census = census_identification(Man)
+            if census is not None:
+                try:
+                    x = int(search_in_census_if_L_space([census]))
+                    print(init_string+"The manifold is in the census, its L-space value is " + str(x))
+                    return self._close(node_id, x == 1, census=census)
+                except Exception:
+                    pass
+        if store is not None:
+            x = store.lookup(Man)
+            if x is not None:
+                print(init_string+": "+node_id+" was found in the store, its L-space value is " + str(x))
+                return self._close(node_id, x == 1, store=True)
+
+        inv.append(man_inv(Man))
+        Man = Man.copy()
+        a, Man = is_hyperbolic(Man)
+        if not a:
+            return self._close(node_id, False, reason='not hyperbolic')
+        print(init_string+": "+node_id+" has volume " + Man.volume().str(digits=6) + "... and homology " + str(Man.homology()))
+
+        details = {}
+        try:
+            drilling = find_drilling(Man, init_string=init_string, max_segms=self.options['max_segms'],
+                                     max_drills=self.options['max_drills'], already_found_inv=inv,
+                                     curves_to_avoid=self.options['curves_to_avoid'] if node_id == self.root else -1,
+                                     lazy_drillings=self.options['lazy_drillings'],
+                                     rank_by_length=self.options['rank_by_length'],
+                                     alexander_prefilter=self.options['alexander_prefilter'], details=details,
+                                     drilling_cache=self.options['drilling_cache'])
+        except Exception as e:
+            print(init_string+": "+str(e))
+            return self._close(node_id, False, reason=str(e))
+        if isinstance(drilling, int):
+            if store is not None:
+                store.record(Man, drilling)
+            return self._close(node_id, drilling == 1, census=details['census'])
+
+        T, tau_T, inv = drilling
+        T.set_name("T"+init_string)
+        T_isosig = T.triangulation_isosig(decorated=True)
+        D = IotaInverseDtau(tau_T)
+        A = D.possible_non_L_space_cones((1, 0))
+        options = []
+        for j, interval in enumerate(A):
+            suffix = '' if len(A) == 1 else 'AB'[j]
+            options.append(self._fillings_option(node_id, T, T_isosig, D, interval, init_string + suffix, inv))
+        node['options'] = options
+        self._manifolds.pop(node_id, None)
+        self.invariants = [[float(x.volume), str(x.homology)] for x in inv]
+
+    def _fillings_option(self, node_id, T, T_isosig, D, interval, init_string, inv):
+        #The option given by the two fillings of minimal volume of T in the complement of the given interval
+        node = self.nodes[node_id]
+        details = {}
+        try:
+            M_1, M_2, found_1, found_2 = search_for_minimal_volume_fillings(
+                T, non_L_space_interval=interval, max_coefficient=self.options['max_coefficient'],
+                init_string=init_string, already_found_inv_fill=inv, details=details,
+                volume_prefilter=self.options['volume_prefilter'], processes=self.options['fill_processes'],
+                filling_cache=self.options['filling_cache'])
+        except Exception as e:
+            print(init_string+": "+str(e))
+            return {'T': T_isosig, 'Dtau': repr(D), 'slopes': [], 'children': [], 'failed': str(e)}
+        fillings = details['fillings']
+        children = []
+        for i, (N, found) in enumerate([(M_1, found_1), (M_2, found_2)]):
+            if found != 0:
+                child = 'M' + init_string + 'c%d' % (i + 1)
+                self._add_closed_node(child, filling_description(T_isosig, fillings[i]), node['depth'] + 1, node_id,
+                                      found == 1, census=details['census'][i])
+            else:
+                child = 'M' + init_string + ('2' if i == 0 else '1')
+                self._add_node(child, N, node['depth'] + 1, node_id)
+            children.append(child)
+        return {'T': T_isosig, 'Dtau': repr(D), 'slopes': [[int(p), int(q)] for p, q in fillings], 'children': children}
+
+    def run(self, max_fillings=None, max_torsions=None, max_expansions=None, path=None, save_every=1):
+        """
+        Expands the cheapest relevant node of the frontier until the value
+        of the root is known, the frontier is empty or one of the budgets
+        (counted since the search started, including previous runs) is
+        exhausted.  Returns True, False or None (not known yet).  If path
+        is given, the search is saved there every save_every expansions
+        and at the end.
+        """
+        set_allowed_solution_type(self.options['only_true_hyperbolic_structures'])
+        self.options['store'] = as_L_space_store(self.options['store'])
+        self.options['filling_cache'] = as_filling_cache(self.options['filling_cache'])
+        self.options['drilling_cache'] = as_drilling_cache(self.options['drilling_cache'])
+        budgets = [('fillings', max_fillings), ('torsions', max_torsions), ('expansions', max_expansions)]
+        count = 0
+        while self.value() is None and self.frontier:
+            if any(limit is not None and self.work[key] >= limit for key, limit in budgets):
+                print("The budget is exhausted.")
+                break
+            node_id = heapq.heappop(self.frontier)[-1]
+            if not self._is_relevant(node_id):
+                continue
+            before = dict(work_done)
+            self.expand(node_id)
+            for key in ['fillings', 'torsions']:
+                self.work[key] += work_done[key] - before[key]
+            count += 1
+            if path is not None and count % save_every == 0:
+                self.save(path)
+        ans = self.value()
+        store = self.options['store']
+        if store is not None and ans:
+            store.record(self._manifold(self.root), 1)
+        if path is not None:
+            self.save(path)
+        return ans
+
+    # The certificate
+
+    def certificate(self):
+        #The certificate of the proof that the root is an L-space (see certificate.py)
+        assert self.value() is True
+        C = Certificate(root=self.root)
+
+        def add(node_id):
+            node = self.nodes[node_id]
+            if node['value'] is True:
+                if 'census' in node:
+                    C.add_census(node_id, node['manifold'], node['census'])
+                else:
+                    C.add_store(node_id, node['manifold'])
+                return
+            option = [option for option in node['options'] if self._option_value(option) is True][0]
+            C.add_drilling(node_id, node['manifold'], option['T'], option['Dtau'], option['slopes'], option['children'])
+            for child in option['children']:
+                add(child)
+
+        add(self.root)
+        return C
+
+    # Saving and resuming
+
+    def to_json(self):
+        options = dict(self.options)
+        for key in ['store', 'filling_cache', 'drilling_cache']:
+            if options[key] is not None and not isinstance(options[key], str):
+                options[key] = options[key].path
+        return json.dumps({'root': self.root, 'options': options, 'nodes': self.nodes, 'frontier': self.frontier,
+                           'work': self.work, 'invariants': self.invariants})
+
+    @staticmethod
+    def from_json(string):
+        data = json.loads(string)
+        S = ProofSearch(**data['options'])
+        S.root = data['root']
+        S.nodes = data['nodes']
+        S.frontier = data['frontier']
+        heapq.heapify(S.frontier)
+        S.work = data['work']
+        S.invariants = data['invariants']
+        return S
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            file.write(self.to_json())
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            return ProofSearch.from_json(file.read())
+
+    def __repr__(self):
+        return 'ProofSearch(root=%r, %d nodes, %d in the frontier, value=%r)' % (
+            self.root, len(self.nodes), len(self.frontier), self.value() if self.root else None)
+
+
+def best_first_certified_L_space(M, max_fillings=None, max_torsions=None, max_expansions=None, path=None,
+                                 certificate=None, **kwargs):
+    """
+    Like is_certified_L_space, but searching the proof best-first (see
+    ProofSearch).  Returns True if M was certified to be an L-space, and
+    False or None (budget exhausted) otherwise.  If certificate is a
+    Certificate, the proof is saved there.
+    """
+    S = ProofSearch(M, **kwargs)
+    ans = S.run(max_fillings=max_fillings, max_torsions=max_torsions, max_expansions=max_expansions, path=path)
+    if certificate is not None and ans:
+        C = S.certificate()
+        certificate.root, certificate.nodes = C.root, C.nodes
+    return ans
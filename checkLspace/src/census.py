@@ -0,0 +1,399 @@
+"""
+Dunfield's census of rational homology solid tori (QHSolidTori.csv.bz2),
+compiled once into a dictionary indexed by name.
+
+The census is loaded on first use, and for each QHT the L-space and non
+L-space fillings are stored as sets of normalized integer slopes and the
+non L-space cone as a SlopeCone (or SingleSlope), so that finding the
+L-space value of a filling costs a dictionary access and a few
+set-membership tests.  For many fillings at once, QHTCensus.L_space_values
+does the same tests on NumPy arrays.
+
+To recognize the QHT of the census without Manifold.identify(), the
+isometry signatures of the census can be precomputed once with
+build_signature_index, e.g. from this directory::
+
+  sage -python census.py --processes 8
+
+then identify_QHT costs one lookup in an sqlite table and one isometry
+test between canonical triangulations for the QHT found in the index;
+for the other manifolds it still uses Manifold.identify().
+"""
+
+import os
+import ast
+import argparse
+import numpy
+import pandas
+from slopes import SlopeCone, SingleSlope
+from store import PersistentStore, isometry_signature
+
+census_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'QHSolidTori.csv.bz2')
+signature_index_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'QHSolidTori_signatures.db')
+
+
+def normalized_slope(slope):
+    """
+    The representative of the unoriented slope (p, q) used in the census
+    sets, i.e. the tuple of Slope(p, q).
+
+    >>> normalized_slope((3, -2)), normalized_slope((-3, 2)), normalized_slope((-1, 0))
+    ((-3, 2), (-3, 2), (1, 0))
+    """
+    p, q = slope
+    if q < 0 or (q == 0 and p < 0):
+        return (-p, -q)
+    return (p, q)
+
+
+def split_census_name(string):
+    """
+    Splits the name of a filling of a census QHT into the name of the QHT
+    and the filling.
+
+    >>> split_census_name('o9_39343(1,-2)')
+    ('o9_39343', (1, -2))
+    """
+    y=str(string).split('(')
+    return y[0], ast.literal_eval('('+y[1])
+
+
+def Slope_valuation(stri):
+    if stri=="None":
+        return None
+    elif stri.startswith("SlopeCone"):
+        x=stri.split("SlopeCone")
+        extr=ast.literal_eval(x[1])
+        if isinstance(extr[0],tuple):
+            S=SlopeCone(extr[0],extr[1])
+            return S
+        else:
+            S=SlopeCone(extr)
+            return S
+    elif stri.startswith("SingleSlope"):
+        x=stri.split("SingleSlope")
+        extr=ast.literal_eval(x[1])
+        S=SingleSlope(extr)
+        return S
+    else:
+        raise Exception("I could not evaluate this string as a slope")
+
+
+class QHTCensusEntry(object):
+    """
+    The data of one QHT of the census needed to decide the L-space value of
+    its fillings.
+    """
+    __slots__ = ['name', 'L_space_fillings', 'non_L_space_fillings', 'non_L_cone', 'floer_simple']
+
+    def __init__(self, name, L_space_fillings, non_L_space_fillings, non_L_cone, floer_simple):
+        self.name = name
+        self.L_space_fillings = frozenset(normalized_slope(s) for s in L_space_fillings)
+        self.non_L_space_fillings = frozenset(normalized_slope(s) for s in non_L_space_fillings)
+        self.non_L_cone = non_L_cone
+        self.floer_simple = floer_simple
+
+    def L_space_value(self, filling):
+        """
+        Returns 1 if the filling is known to be an L-space, -1 if it is known
+        not to be one, and None otherwise.
+        """
+        slope = normalized_slope(filling)
+        if slope in self.L_space_fillings:
+            return 1
+        if slope in self.non_L_space_fillings:
+            return -1
+        if self.non_L_cone is not None:
+            if filling in self.non_L_cone:
+                return -1
+            if self.floer_simple == 1:
+                return 1
+        return None
+
+    def __repr__(self):
+        return 'QHTCensusEntry(%s)' % self.name
+
+
+class QHTCensus(object):
+    """
+    The census QHSolidTori.csv.bz2 indexed by name. The file is read the
+    first time the census is accessed.
+    """
+    def __init__(self, path=census_file):
+        self.path = path
+        self._entries = None
+        self._arrays = None
+
+    def entries(self):
+        if self._entries is None:
+            self._entries = self._compile()
+        return self._entries
+
+    def compiled_arrays(self):
+        if self._arrays is None:
+            self._arrays = compile_census_arrays(list(self.entries().values()))
+        return self._arrays
+
+    def _compile(self):
+        columns = ['name', 'L_space_fillings', 'non_L_space_fillings', 'non_L_cone', 'floer_simple']
+        df = pandas.read_csv(self.path, usecols=columns, keep_default_na=False)
+        #Many QHT share the same cone, we build each SlopeCone only once
+        cones = dict()
+        ans = dict()
+        for name, L_fill, non_L_fill, cone, floer_simple in zip(*[df[c] for c in columns]):
+            if cone not in cones:
+                try:
+                    cones[cone] = Slope_valuation(cone)
+                except Exception:
+                    cones[cone] = None
+            ans[name] = QHTCensusEntry(name, ast.literal_eval(L_fill), ast.literal_eval(non_L_fill),
+                                       cones[cone], int(floer_simple))
+        return ans
+
+    def __getitem__(self, name):
+        return self.entries()[name]
+
+    def __contains__(self, name):
+        return name in self.entries()
+
+    def __len__(self):
+        return len(self.entries())
+
+    def get(self, name, default=None):
+        return self.entries().get(name, default)
+
+    def L_space_value(self, name, filling):
+        """
+        The L-space value (1, -1 or None if unknown) of the given filling of
+        the QHT with the given name.
+        """
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return entry.L_space_value(filling)
+
+    def L_space_values(self, names, p, q):
+        """
+        The L-space values of the fillings (p[i], q[i]) of the QHT names[i],
+        as an array of 1 (L-space), -1 (non L-space) and 0 (unknown, or the
+        name is not in the census); names can also be a single name.  This
+        is the same as QHTCensus.L_space_value, filling by filling, also
+        on the endpoints of the cones:
+
+        >>> C = qht_census()
+        >>> entries = [e for e in C.entries().values() if e.non_L_cone is not None][:50]
+        >>> entries += [e for e in C.entries().values() if e.non_L_cone is None][:10]
+        >>> names, slopes = ['not_a_QHT'], [(1, 0)]
+        >>> for e in entries:
+        ...     cone = e.non_L_cone
+        ...     edges = [cone.u.tuple, cone.v.tuple] if isinstance(cone, SlopeCone) else []
+        ...     edges += [cone.slope.tuple] if isinstance(cone, SingleSlope) else []
+        ...     edges += [(-x, -y) for x, y in edges]
+        ...     for slope in edges + [(1, 0), (0, 1), (1, 1), (-1, 1), (5, -3), (-2, 7)]:
+        ...         names.append(e.name)
+        ...         slopes.append(slope)
+        ...     for slope in list(e.L_space_fillings)[:3] + list(e.non_L_space_fillings)[:3]:
+        ...         names.append(e.name)
+        ...         slopes.append(slope)
+        >>> values = C.L_space_values(names, [x for x, y in slopes], [y for x, y in slopes])
+        >>> [int(x) for x in values] == [C.L_space_value(name, slope) or 0 for name, slope in zip(names, slopes)]
+        True
+        """
+        data = self.compiled_arrays()
+        p, q = numpy.asarray(p, dtype=numpy.int64), numpy.asarray(q, dtype=numpy.int64)
+        p, q = numpy.broadcast_arrays(p, q)
+        if isinstance(names, str):
+            indices = numpy.full(p.shape, data['index'].get(names, -1), dtype=numpy.int64)
+        else:
+            indices = numpy.array([data['index'].get(name, -1) for name in names], dtype=numpy.int64)
+        known = indices >= 0
+        i = numpy.where(known, indices, 0)
+        normal_p, normal_q = _normalized_slopes(p, q)
+        encodable = (numpy.abs(normal_p) < _slope_code_base//2) & (normal_q < _slope_code_base)
+        codes = _slope_codes(i, numpy.where(encodable, normal_p, 0), numpy.where(encodable, normal_q, 0))
+        is_L = encodable & numpy.isin(codes, data['L_codes'])
+        is_non_L = encodable & numpy.isin(codes, data['non_L_codes'])
+        kind = data['kind'][i]
+        in_cone = in_non_L_cones(kind, data['u'][i], data['v'][i], p, q)
+        floer_simple = (kind != NO_CONE) & (data['floer_simple'][i] == 1)
+        ans = numpy.select([is_L, is_non_L, in_cone, floer_simple], [1, -1, -1, 1], 0)
+        return numpy.where(known, ans, 0).astype(numpy.int8)
+
+
+#The slopes (p, q) of the census are encoded with the index i of their QHT as the integer (i*B + p + B/2)*B + q,
+#where (p, q) is normalized so that q >= 0; B bounds the coefficients of the slopes that can be encoded
+_slope_code_base = 2**21
+
+def _slope_codes(indices, p, q):
+    B = _slope_code_base
+    return (indices*B + p + B//2)*B + q
+
+
+def _normalized_slopes(p, q):
+    #The vectorized version of normalized_slope
+    flip = (q < 0) | ((q == 0) & (p < 0))
+    return numpy.where(flip, -p, p), numpy.where(flip, -q, q)
+
+
+#The kinds of non L-space cones, in the arrays of QHTCensus.compiled_arrays
+NO_CONE, SLOPE_CONE, COMPLEMENT_OF_SLOPE, SINGLE_SLOPE = 0, 1, 2, 3
+
+
+def compile_census_arrays(entries):
+    """
+    The data of the given QHTCensusEntry's as NumPy arrays, used by
+    QHTCensus.L_space_values: the index of each name, the kind of cone
+    and its endpoints u and v, the floer_simple flags and the sorted codes
+    (see _slope_codes) of the L-space and non L-space fillings.
+    """
+    n = len(entries)
+    index = dict()
+    kind = numpy.zeros(n, dtype=numpy.int8)
+    u = numpy.zeros((n, 2), dtype=numpy.int64)
+    v = numpy.zeros((n, 2), dtype=numpy.int64)
+    floer_simple = numpy.zeros(n, dtype=numpy.int8)
+    L_codes, non_L_codes = [], []
+    for i, entry in enumerate(entries):
+        index[entry.name] = i
+        floer_simple[i] = entry.floer_simple
+        cone = entry.non_L_cone
+        if isinstance(cone, SlopeCone):
+            u[i], v[i] = [int(x) for x in cone.u.tuple], [int(x) for x in cone.v.tuple]
+            kind[i] = SLOPE_CONE if cone.u != cone.v else COMPLEMENT_OF_SLOPE
+        elif isinstance(cone, SingleSlope):
+            u[i] = v[i] = [int(x) for x in cone.slope.tuple]
+            kind[i] = SINGLE_SLOPE
+        for fillings, codes in [(entry.L_space_fillings, L_codes), (entry.non_L_space_fillings, non_L_codes)]:
+            for p, q in fillings:
+                assert abs(p) < _slope_code_base//2 and q < _slope_code_base
+                codes.append(_slope_codes(i, p, q))
+    return {'index': index, 'kind': kind, 'u': u, 'v': v, 'floer_simple': floer_simple,
+            'L_codes': numpy.sort(numpy.array(L_codes, dtype=numpy.int64)),
+            'non_L_codes': numpy.sort(numpy.array(non_L_codes, dtype=numpy.int64))}
+
+
+def in_non_L_cones(kind, u, v, p, q):
+    """
+    Whether the slopes (p[i], q[i]) are in the cones of the given kinds
+    and endpoints u[i], v[i], with the test of SlopeCone.__contains__
+    (resp. SingleSlope.__contains__).
+
+    >>> kind = numpy.array([SLOPE_CONE, SLOPE_CONE, COMPLEMENT_OF_SLOPE, SINGLE_SLOPE, NO_CONE])
+    >>> u = numpy.array([(1, 0), (1, 0), (1, 0), (2, 1), (0, 1)])
+    >>> v = numpy.array([(0, 1), (0, 1), (1, 0), (2, 1), (0, 1)])
+    >>> in_non_L_cones(kind, u, v, numpy.array([1, -1, 0, -4, 1]), numpy.array([1, 1, 1, -2, 1]))
+    array([ True, False,  True,  True, False])
+    """
+    u_x = u[:, 0]*q - u[:, 1]*p
+    x_v = p*v[:, 1] - q*v[:, 0]
+    v_u = v[:, 0]*u[:, 1] - v[:, 1]*u[:, 0]
+    return numpy.where(kind == SLOPE_CONE, u_x*x_v*v_u < 0,
+                       numpy.where(kind == COMPLEMENT_OF_SLOPE, u_x != 0,
+                                   numpy.where(kind == SINGLE_SLOPE, u_x == 0, False)))
+
+
+_qht_census = None
+
+def qht_census():
+    #The census is shared by all the callers, and loaded only when first needed
+    global _qht_census
+    if _qht_census is None:
+        _qht_census = QHTCensus()
+    return _qht_census
+
+
+class SignatureIndex(PersistentStore):
+    """
+    The QHT of the census keyed by isometry signature.  Each value is the
+    name of the QHT and its isometry signature with peripheral curves,
+    which gives its canonical triangulation with the framing of the
+    census.
+    """
+    table = 'qht_signatures'
+
+
+def _signature_data(name):
+    #Runs in the processes of build_signature_index
+    import snappy
+    try:
+        X = snappy.Manifold(name)
+        return name, X.isometry_signature(), X.isometry_signature(of_link=True)
+    except Exception:
+        return name, None, None
+
+
+def build_signature_index(path=signature_index_file, processes=1):
+    """
+    Computes the isometry signatures of all the QHT of the census and saves
+    them in a SignatureIndex at the given path (by default, the one used
+    by identify_QHT).  Returns the names whose signature could not be
+    computed.
+    """
+    from parallel import map_in_parallel
+    names = sorted(qht_census().entries())
+    if processes > 1:
+        data = map_in_parallel(_signature_data, names, processes)
+    else:
+        data = [_signature_data(name) for name in names]
+    index = SignatureIndex(path)
+    failed = []
+    for name, signature, decorated in data:
+        if signature is None:
+            failed.append(name)
+        elif signature not in index:
+            index[signature] = {'name': name, 'decorated': decorated}
+    return failed
+
+
+_signature_index = None
+
+def signature_index():
+    #The SignatureIndex of the census, or None if it was not built
+    global _signature_index
+    if _signature_index is None and os.path.exists(signature_index_file):
+        _signature_index = SignatureIndex(signature_index_file)
+    return _signature_index
+
+
+def identify_QHT(N):
+    """
+    Looks for the QHT of the census isometric to the one-cusped manifold N,
+    first in the SignatureIndex (if it was built) and then, if N is not
+    found there, with Manifold.identify(): the index may be partial (e.g.
+    its construction was interrupted, or the signature of some QHT could
+    not be computed) or built by a version of SnapPy with different
+    signatures.  Returns None if N is not a QHT of the census, otherwise
+    the name of the QHT and the QHT itself, with the framing of the
+    census.
+    """
+    import snappy
+    index = signature_index()
+    signature = None
+    if index is not None:
+        signature = isometry_signature(N)
+    if signature is not None:
+        value = index.get(signature)
+        if value is not None:
+            return value['name'], snappy.Manifold(value['decorated'])
+    try:
+        ids = N.identify()
+    except Exception:
+        return None
+    for X in ids:
+        name = split_census_name(str(X))[0]
+        if name in qht_census():
+            return name, snappy.Manifold(name)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the isometry signature index of the QHT census.')
+    parser.add_argument('--index', default=signature_index_file, help='the index file (default: the one used by identify_QHT)')
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args(argv)
+    failed = build_signature_index(args.index, args.processes)
+    print('%d QHT of the census indexed, %d failed: %s' % (len(qht_census()) - len(failed), len(failed), ' '.join(failed)))
+
+
+if __name__ == '__main__':
+    main()
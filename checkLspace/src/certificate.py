@@ -0,0 +1,214 @@
+"""
+Machine-checkable certificates for the answer True of
+is_certified_L_space, and a verifier that replays only the cheap checks.
+
+A certificate is stored as a JSON string of the form::
+
+  {
+    "root": "M",
+    "nodes": {
+      "M":   {"manifold": {"isosig": "...", "fillings": [[1, 0]]},
+              "type": "drilling",
+              "T": "...",
+              "Dtau": "IotaInverseDtau(L=1,m=(-1,0),l=(3,-1),values=[(1,0)])",
+              "slopes": [[0, 1], [1, 1]],
+              "children": ["Mc1", "M2"]},
+      "Mc1": {"manifold": {"isosig": "...", "fillings": [[0, 1]]},
+              "type": "census",
+              "census": "v3257(-3,2)"},
+      ...
+    }
+  }
+
+Each node claims that its manifold is an L-space, because either:
+
+* "census": the manifold is isometric to the given filling of a QHT of
+  Dunfield's census, which is known to be an L-space.
+
+* "drilling": the manifold is the filling T(1, 0) of the cusped manifold
+  T (given by its decorated triangulation isosig), the Turaev torsion of
+  T could be the one of a Floer simple manifold, and the fillings of T
+  along the two given slopes are L-spaces (the children nodes).  Then T
+  is Floer simple [RR] and its L-space interval is the complement of
+  IotaInverseDtau(tau).non_L_space_cone(slopes), which must contain (1, 0).
+
+* "store": the manifold was found in an LSpaceStore; such nodes are not
+  verifiable on their own.
+
+A node can be the child of several nodes, so the proof is a DAG.
+"""
+
+import sys
+import json
+import snappy
+from turaev import TuraevTorsion, IotaInverseDtau
+from slopes import Slope
+from census import qht_census, split_census_name
+
+
+def manifold_description(M, fillings=None):
+    #The isosig of the triangulation of M (with its peripheral curves) and the Dehn fillings of M
+    if fillings is None:
+        fillings = [tuple(c.filling) for c in M.cusp_info()]
+    return {'isosig': M.triangulation_isosig(decorated=True),
+            'fillings': [[int(p), int(q)] for p, q in fillings]}
+
+
+def manifold_from_description(desc):
+    M = snappy.Manifold(desc['isosig'])
+    if desc['fillings'] is not None:
+        M.dehn_fill([tuple(s) for s in desc['fillings']])
+    return M
+
+
+def filling_description(T_isosig, slope):
+    #The description of the filling of the one-cusped manifold with the given isosig
+    return {'isosig': T_isosig, 'fillings': [[int(slope[0]), int(slope[1])]]}
+
+
+class Certificate(object):
+    """
+    The nodes of a proof, built while is_certified_L_space runs.
+
+    >>> C = Certificate()
+    >>> C.add('M', {'type': 'store', 'manifold': {'isosig': 'cPcbbbiht_BaCB', 'fillings': [[1, 2]]}})
+    >>> C.root = 'M'
+    >>> D = Certificate.from_json(C.to_json())
+    >>> D.root, sorted(D.nodes)
+    ('M', ['M'])
+    """
+    def __init__(self, root=None, nodes=None):
+        self.root = root
+        self.nodes = dict() if nodes is None else nodes
+
+    def add(self, node_id, node):
+        self.nodes[node_id] = node
+
+    def add_census(self, node_id, desc, census):
+        self.add(node_id, {'manifold': desc, 'type': 'census', 'census': str(census)})
+
+    def add_store(self, node_id, desc):
+        self.add(node_id, {'manifold': desc, 'type': 'store'})
+
+    def add_drilling(self, node_id, desc, T_isosig, D, slopes, children):
+        #D is an IotaInverseDtau or its repr
+        self.add(node_id, {'manifold': desc, 'type': 'drilling', 'T': T_isosig, 'Dtau': D if isinstance(D, str) else repr(D),
+                           'slopes': [[int(p), int(q)] for p, q in slopes], 'children': list(children)})
+
+    #The following two methods are used by parallel.py to bring back the nodes found in a child process
+    def child_state(self):
+        return self.nodes
+
+    def merge_child_state(self, nodes):
+        self.nodes.update(nodes)
+
+    def to_json(self):
+        return json.dumps({'root': self.root, 'nodes': self.nodes})
+
+    @staticmethod
+    def from_json(string):
+        data = json.loads(string)
+        return Certificate(data['root'], data['nodes'])
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            file.write(self.to_json())
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            return Certificate.from_json(file.read())
+
+    def __repr__(self):
+        return 'Certificate(root=%r, %d nodes)' % (self.root, len(self.nodes))
+
+
+class CertificateError(Exception):
+    pass
+
+
+def is_isometric(M, N):
+    try:
+        return bool(M.is_isometric_to(N))
+    except Exception:
+        return False
+
+
+def verify_certificate(certificate, trust_store=False, verbose=False):
+    """
+    Checks the given certificate (a Certificate, a JSON string or the path
+    of a file), without any search.  Returns True if it proves that the
+    root is an L-space and raises a CertificateError otherwise.
+    """
+    C = certificate
+    if not isinstance(C, Certificate):
+        C = Certificate.from_json(C) if C.lstrip().startswith('{') else Certificate.load(C)
+    verified = set()
+
+    def check(node_id):
+        if node_id in verified:
+            return
+        if node_id not in C.nodes:
+            raise CertificateError('Missing node %s' % node_id)
+        node = C.nodes[node_id]
+        M = manifold_from_description(node['manifold'])
+        if node['type'] == 'census':
+            name, filling = split_census_name(node['census'])
+            if qht_census().L_space_value(name, filling) != 1:
+                raise CertificateError('%s: %s is not an L-space of the census' % (node_id, node['census']))
+            if not is_isometric(M, snappy.Manifold(node['census'])):
+                raise CertificateError('%s: the manifold is not %s' % (node_id, node['census']))
+        elif node['type'] == 'drilling':
+            T = snappy.Manifold(node['T'])
+            T.dehn_fill((0, 0))
+            if T.num_cusps() != 1:
+                raise CertificateError('%s: T does not have one cusp' % node_id)
+            T_filled = T.copy()
+            T_filled.dehn_fill((1, 0))
+            if not is_isometric(M, T_filled):
+                raise CertificateError('%s: the manifold is not T(1, 0)' % node_id)
+            tau = TuraevTorsion(T)
+            if not tau.could_be_floer_simple():
+                raise CertificateError('%s: T is not Floer simple' % node_id)
+            D = IotaInverseDtau(tau)
+            if repr(D) != node['Dtau']:
+                raise CertificateError('%s: the torsion of T is %r' % (node_id, D))
+            slopes = [tuple(s) for s in node['slopes']]
+            try:
+                cone = D.non_L_space_cone(slopes)
+            except (ValueError, AssertionError):
+                raise CertificateError('%s: the slopes do not determine a cone' % node_id)
+            if Slope((1, 0)) in cone:
+                raise CertificateError('%s: (1, 0) is in the non L-space cone' % node_id)
+            for slope, child in zip(slopes, node['children']):
+                check(child)
+                desc = C.nodes[child]['manifold']
+                if desc != filling_description(node['T'], slope):
+                    if not is_isometric(manifold_from_description(desc), manifold_from_description(filling_description(node['T'], slope))):
+                        raise CertificateError('%s: %s is not T%s' % (node_id, child, slope))
+        elif node['type'] == 'store' and trust_store:
+            pass
+        else:
+            raise CertificateError('%s: a node of type %s can not be verified' % (node_id, node['type']))
+        if verbose:
+            print('%s: verified (%s)' % (node_id, node['type']))
+        verified.add(node_id)
+
+    check(C.root)
+    return True
+
+
+def verify_certificates(paths, trust_store=False):
+    #Verifies several certificates, returning a dictionary from the paths to True or the error found
+    ans = dict()
+    for path in paths:
+        try:
+            ans[path] = verify_certificate(path, trust_store=trust_store)
+        except Exception as e:
+            ans[path] = repr(e)
+        print('%s: %s' % (path, ans[path]))
+    return ans
+
+
+if __name__ == '__main__':
+    verify_certificates(sys.argv[1:])
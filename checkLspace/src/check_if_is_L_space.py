@@ -2,21 +2,33 @@ from snappy import *
 from slopes import *
 from turaev import *
 from copy import *
-import ast
-import pandas
+import parallel
+from parallel import evaluate_in_parallel, map_in_parallel
+from store import LSpaceStore, as_L_space_store, FillingCache, as_filling_cache, DrillingCache, as_drilling_cache, isometry_signature
+from census import qht_census, split_census_name, Slope_valuation, identify_QHT
+from certificate import Certificate, manifold_description, filling_description
+from cusp_geometry import order_slopes_by_volume_bound
+from tracing import Tracer, stage, timed, traced_node
+from handle import ManifoldHandle
+from refutation import has_taut_foliation, persistent_non_L_slopes
+import os
+import math
 #import turaev
 
-qht_final = pandas.read_csv('./src/QHSolidTori.csv.bz2')
-#This was useful but does not work with old pandas
-#pandas.options.display.max_colwidth= None
+#Two manifolds are considered the same if their volumes differ less than this and they have the same homology
+man_inv_tolerance=0.000001
 
 class man_inv:
-    def __init__(self,Manifold):
-        self.volume=Manifold.volume()
-        self.homology=Manifold.homology()
+    #The invariants can also be given directly (e.g. when they were computed in another process)
+    def __init__(self,Manifold=None, volume=None, homology=None):
+        if Manifold is not None:
+            volume=Manifold.volume()
+            homology=Manifold.homology()
+        self.volume=volume
+        self.homology=homology
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return ( abs(self.volume - other.volume) < 0.000001 and self.homology == other.homology)
+            return ( abs(self.volume - other.volume) < man_inv_tolerance and str(self.homology) == str(other.homology))
         else:
             return False
     def __repr__(self):
@@ -25,32 +37,298 @@ class man_inv:
         return str(self.volume)+", "+str(self.homology)
     
 
+class man_inv_index:
+    """
+    A set of man_inv, with constant time insertion and membership. The elements are hashed by homology and by
+    a bucket of the volume of width twice the tolerance; two volumes closer than the tolerance are then in the same
+    or in neighbouring buckets, so we only compare element with the man_inv in three buckets. The answers are the
+    same as the ones of inside_man_inv on a list, also for volumes on the two sides of the edge of a bucket:
+
+    >>> tol=man_inv_tolerance
+    >>> edge=2000*tol
+    >>> index=man_inv_index([man_inv(volume=edge-0.4*tol, homology='Z/5'), man_inv(volume=2.5, homology='Z/5 + Z/5')])
+    >>> man_inv(volume=edge+0.4*tol, homology='Z/5') in index, man_inv(volume=edge+0.4*tol, homology='Z/7') in index
+    (True, False)
+    >>> man_inv(volume=edge+0.7*tol, homology='Z/5') in index
+    False
+    >>> import random
+    >>> elements=[man_inv(volume=edge+random.uniform(-3, 3)*tol, homology=random.choice(['Z/5', 'Z/7'])) for i in range(50)]
+    >>> queries=[man_inv(volume=edge+random.uniform(-5, 5)*tol, homology=random.choice(['Z/5', 'Z/7'])) for i in range(1000)]
+    >>> index=man_inv_index(elements)
+    >>> [x in index for x in queries] == [inside_man_inv(x, elements) for x in queries]
+    True
+    >>> len(index), sorted(map(str, index)) == sorted(map(str, elements))
+    (50, True)
+
+    In a forked branch (see parallel.py) the elements added and the ones not found are logged, so that a later branch
+    which did not find an element added by an earlier one is evaluated again:
+
+    >>> index=man_inv_index()
+    >>> man_inv(volume=2.0, homology='Z/5') in index
+    False
+    >>> earlier=man_inv_index([man_inv(volume=2.0+0.1*tol, homology='Z/5')])
+    >>> index.invalidates(earlier.child_state(), index.child_state())
+    True
+    >>> other=man_inv_index()
+    >>> other.merge_child_state(earlier.child_state())
+    >>> man_inv(volume=2.0, homology='Z/5') in other
+    True
+    """
+    def __init__(self, elements=[]):
+        self.buckets={}
+        self.size=0
+        self._pid=os.getpid()
+        self._added=[]
+        self._missed=[]
+        for x in elements:
+            self.append(x)
+    def _local(self):
+        #In a forked process the logs start again from the fork
+        if self._pid!=os.getpid():
+            self._pid=os.getpid()
+            self._added=[]
+            self._missed=[]
+    def _key(self, element, shift=0):
+        return (int(math.floor(float(element.volume)/(2*man_inv_tolerance)))+shift, str(element.homology))
+    def append(self, element):
+        self._local()
+        self.buckets.setdefault(self._key(element), []).append(element)
+        self.size=self.size+1
+        self._added.append((float(element.volume), str(element.homology)))
+    def __contains__(self, element):
+        for shift in [0,-1,1]:
+            for x in self.buckets.get(self._key(element, shift), []):
+                if ( (abs(x.volume - element.volume) < man_inv_tolerance) and str(x.homology) == str(element.homology)):
+                    return True
+        self._local()
+        self._missed.append((float(element.volume), str(element.homology)))
+        return False
+    def __iter__(self):
+        for bucket in self.buckets.values():
+            for x in bucket:
+                yield x
+    def __len__(self):
+        return self.size
+    def __repr__(self):
+        return repr(list(self))
+    #The following three methods are used by parallel.py to bring back the invariants found in a child process
+    def child_state(self):
+        self._local()
+        return {'added': self._added, 'missed': self._missed}
+    def merge_child_state(self, state):
+        for volume, homology in state['added']:
+            self.append(man_inv(volume=volume, homology=homology))
+    def invalidates(self, state, later_state):
+        #True if a later branch did not find one of the elements added by an earlier branch
+        added=man_inv_index([man_inv(volume=volume, homology=homology) for volume, homology in state['added']])
+        return any(man_inv(volume=volume, homology=homology) in added for volume, homology in later_state['missed'])
+
+
+class transposition_table:
+    """
+    The answers of is_certified_L_space on the manifolds already met in the same run, keyed by isometry signature, so
+    that a manifold reached again through a different T reuses its sub-proof. An answer False is reused only if it was
+    found with at least as many iterations left, since it may be due to max_iter.
+
+    >>> table=transposition_table()
+    >>> table.record('sigA', True, 'M1', 10)
+    True
+    >>> table.lookup('sigA', 20)['cert_node'], table.proved('sigA')
+    ('M1', True)
+    >>> table.record('sigB', False, 'M2', 5)
+    False
+    >>> table.lookup('sigB', 5)['value'], table.lookup('sigB', 6), table.proved('sigB')
+    (False, None, False)
+    >>> table.lookup('sigC', 1) is None, table.lookup(None, 1) is None
+    (True, True)
+    >>> other=transposition_table()
+    >>> other.merge_child_state(table.child_state())
+    >>> len(other)
+    2
+    >>> other.lookup('sigD', 3) is None
+    True
+    >>> table.record('sigD', True, 'M3', 1)
+    True
+    >>> table.invalidates(table.child_state(), other.child_state())
+    True
+
+    A filling already met is avoided by search_for_minimal_volume_fillings, unless it is a proved L-space in the table:
+
+    >>> import io, contextlib
+    >>> T=Manifold('m016')
+    >>> interval=IotaInverseDtau(TuraevTorsion(T)).possible_non_L_space_cones((1,0))[0]
+    >>> with contextlib.redirect_stdout(io.StringIO()):
+    ...     M_1=search_for_minimal_volume_fillings(T, interval, max_coefficient=5)[0]
+    >>> avoid=man_inv_index([man_inv(M_1)])
+    >>> table=transposition_table()
+    >>> table.record(table.key(M_1), True, 'M1', 10)
+    True
+    >>> with contextlib.redirect_stdout(io.StringIO()):
+    ...     reused=search_for_minimal_volume_fillings(T, interval, max_coefficient=5, already_found_inv_fill=avoid, transpositions=table)
+    ...     avoided=search_for_minimal_volume_fillings(T, interval, max_coefficient=5, already_found_inv_fill=avoid)
+    >>> any(man_inv(N)==man_inv(M_1) for N in reused[:2]), any(man_inv(N)==man_inv(M_1) for N in avoided[:2])
+    (True, False)
+    """
+    def __init__(self):
+        self.entries={}
+        self._pid=os.getpid()
+        self._missed=[]
+    def _local(self):
+        #In a forked process the log of the keys not found starts again from the fork
+        if self._pid!=os.getpid():
+            self._pid=os.getpid()
+            self._missed=[]
+    def _answers(self, entry, iterations_left):
+        #iterations_left is None for the question of proved
+        return entry is not None and (entry['value'] or (iterations_left is not None and entry['iterations_left'] >= iterations_left))
+    def key(self, Man):
+        return isometry_signature(Man)
+    def lookup(self, key, iterations_left):
+        if key is None:
+            return None
+        entry=self.entries.get(key)
+        if self._answers(entry, iterations_left):
+            return entry
+        self._local()
+        self._missed.append((key, iterations_left))
+        return None
+    def proved(self, key):
+        #True if the manifold with the given key was proved to be an L-space
+        if self._answers(self.entries.get(key), None):
+            return True
+        if key is None:
+            return False
+        self._local()
+        self._missed.append((key, None))
+        return False
+    def record(self, key, value, cert_node, iterations_left):
+        if key is not None:
+            self.entries[key]={'value': bool(value), 'cert_node': cert_node, 'iterations_left': iterations_left}
+        return value
+    #The following three methods are used by parallel.py to bring back the answers found in a child process
+    def child_state(self):
+        self._local()
+        return {'entries': self.entries, 'missed': self._missed}
+    def merge_child_state(self, state):
+        self.entries.update(state['entries'])
+    def invalidates(self, state, later_state):
+        #True if a later branch did not find an answer that an earlier branch has
+        return any(self._answers(state['entries'].get(key), iterations_left) for key, iterations_left in later_state['missed'])
+    def __len__(self):
+        return len(self.entries)
+
+
 def inside_man_inv(element, lista):
+    if isinstance(lista, man_inv_index):
+        return element in lista
     for x in lista:
-        if ( (abs(x.volume - element.volume) < 0.000001) and x.homology == element.homology):
+        if ( (abs(x.volume - element.volume) < man_inv_tolerance) and str(x.homology) == str(element.homology)):
             return True
     return False
 
 
 
-def is_hyperbolic(M):
-    #Returns true if M (maybe canonized) admits a good solution_type and the triangulation that supports such solution
+#The triangulations with a good solution found by is_hyperbolic, keyed by the triangulation it was given (see is_hyperbolic)
+_good_triangulations={}
+#The number of fillings evaluated, of curves drilled and of Turaev torsions computed, and the maximal depth reached by
+#is_certified_L_space; used as a budget by best_first.py and reported by benchmark.py
+class work_counter(dict):
+    #In a forked process (see parallel.py) the counts start again from 0; the counts of the child are then sent back,
+    #added to the ones of the parent, and the maximal depths are compared
+    def __init__(self, keys):
+        dict.__init__(self, [(key, 0) for key in keys])
+        self._pid=os.getpid()
+    def _local(self):
+        if self._pid!=os.getpid():
+            self._pid=os.getpid()
+            for key in list(dict.keys(self)):
+                dict.__setitem__(self, key, 0)
+    def __getitem__(self, key):
+        self._local()
+        return dict.__getitem__(self, key)
+    def __setitem__(self, key, value):
+        self._local()
+        dict.__setitem__(self, key, value)
+    def child_state(self):
+        self._local()
+        return dict(self)
+    def merge_child_state(self, state):
+        for key, value in state.items():
+            if key=='max_depth':
+                self[key]=max(self[key], value)
+            else:
+                self[key]=self[key]+value
+
+work_done=work_counter(['fillings', 'drillings', 'torsions', 'max_depth'])
+parallel.global_collectors.append(work_done)
+#How many calls of is_hyperbolic needed a given number of attempts; the failed calls are counted with key None
+hyperbolic_attempts={}
+
+def set_allowed_solution_type(only_true_hyperbolic_structures=False):
+    #The solution types accepted by is_hyperbolic
+    global allowed_solution_type
+    if only_true_hyperbolic_structures==True:
+        allowed_solution_type=[1]
+    else:
+        allowed_solution_type=[1,2]
+
+def has_good_solution(M):
+    try:
+        return M.solution_type(enum=True) in allowed_solution_type and M.volume()>=0.94
+    except:
+        return False
+
+@timed('is_hyperbolic')
+def is_hyperbolic(M, max_attempts=50):
+    #Returns true if M (maybe retriangulated) admits a good solution_type and the triangulation that supports such solution.
+    #If the solution of M is not good, we try the following steps in turn, until one works or max_attempts steps were done:
+    #canonize the triangulation, randomize it, start again from a random retriangulation of the given triangulation.
+    #The first step is deterministic, so that when it works the triangulation (hence e.g. the order of the dual curves)
+    #is the same in every run.
+    #The triangulation that worked is remembered, keyed by the triangulation and the fillings of M, so the next call
+    #on the same manifold starts from it.
 
     #We do this so M does not change outside the function
     M=M.copy()
 
-    if M.solution_type(enum=True) not in allowed_solution_type or M.volume()<0.94:
-        #Sometimes we need several tries to find a good solution_type
-        count=0
-        while M.solution_type(enum=True) not in allowed_solution_type or M.volume()<0.94:
-            try:
+    if has_good_solution(M):
+        hyperbolic_attempts[0]=hyperbolic_attempts.get(0,0)+1
+        return [True, M]
+
+    fillings=[tuple(c.filling) for c in M.cusp_info()]
+    isosig=M.triangulation_isosig(decorated=True)
+    key=(isosig, str(fillings))
+    if key in _good_triangulations:
+        N=Manifold(_good_triangulations[key])
+        N.dehn_fill(fillings)
+        N.set_name(M.name())
+        if has_good_solution(N):
+            hyperbolic_attempts[0]=hyperbolic_attempts.get(0,0)+1
+            return [True, N]
+
+    count=0
+    while count < max_attempts:
+        step=count%3
+        count=count+1
+        try:
+            if step==0:
                 M.canonize()
-            except:
-                pass
-            count=count+1
-            if count >50:
-                return [False, M]
-    return [True, M]
+            elif step==1:
+                M.randomize()
+            else:
+                name=M.name()
+                M=Manifold(isosig)
+                M.dehn_fill(fillings)
+                M.set_name(name)
+                M.randomize()
+        except:
+            pass
+        if has_good_solution(M):
+            _good_triangulations[key]=M.triangulation_isosig(decorated=True)
+            hyperbolic_attempts[count]=hyperbolic_attempts.get(count,0)+1
+            return [True, M]
+    hyperbolic_attempts[None]=hyperbolic_attempts.get(None,0)+1
+    return [False, M]
 
 def my_boolean(value):
     if isinstance(value, bool):
@@ -63,59 +341,15 @@ def my_boolean(value):
     else:
         raise Exception("I should convert " + str(value) +" into a boolean, i do not know how.")
         
-def Slope_valuation(stri):
-    if stri=="None":
-        return None
-    elif stri.startswith("SlopeCone"):
-        x=stri.split("SlopeCone")
-        extr=ast.literal_eval(x[1])
-        if isinstance(extr[0],tuple):
-            S=SlopeCone(extr[0],extr[1])
-            return S
-        else:
-            S=SlopeCone(extr)
-            return S
-    elif stri.startswith("SingleSlope"):
-        x=stri.split("SingleSlope")
-        extr=ast.literal_eval(x[1])
-        S=SingleSlope(extr)
-        return S
-    else:
-        raise Exception("I could not evaluate this string as a slope")
-
+@timed('census')
 def search_in_census_if_L_space(string):
     identity=string
     if not identity == []:
-        x=str(identity[0])
-        y=str(x).split('(')
-        name_qht=y[0]
-        filling_qht_str='('+y[1]
-        filling_qht=ast.literal_eval(filling_qht_str)
+        name_qht, filling_qht=split_census_name(identity[0])
         #Here we check if the filling is already known
-        y=qht_final[qht_final['name']==name_qht]['L_space_fillings'].values[0]
-        dehn_fillings_L_spaces=ast.literal_eval(y)
-        if filling_qht in dehn_fillings_L_spaces or (-filling_qht[0], -filling_qht[1]) in dehn_fillings_L_spaces:
-            return 1
-        y=qht_final[qht_final['name']==name_qht]['non_L_space_fillings'].values[0]
-        dehn_fillings_non_L_spaces=ast.literal_eval(y)
-        if filling_qht in dehn_fillings_non_L_spaces or (-filling_qht[0], -filling_qht[1]) in dehn_fillings_non_L_spaces:
-            return -1
-        y=qht_final[qht_final['name']==name_qht]['non_L_cone'].values[0]
-        try:
-            S=Slope_valuation(y)
-            if Slope(filling_qht) in S:
-                return -1
-        except:
-            pass
-        y=qht_final[qht_final['name']==name_qht]['floer_simple'].values[0]
-        if y==1:
-            y=qht_final[qht_final['name']==name_qht]['non_L_cone'].values[0]
-            try:
-                S=Slope_valuation(y)
-                if Slope(filling_qht) not in S:
-                    return 1
-            except:
-                pass
+        x=qht_census().L_space_value(name_qht, filling_qht)
+        if x is not None:
+            return x
     print("We found "+ str(identity[0]) +", a filling of one of the 0.2% of QHT in Dunfield census whose L-space fillings are not known. We move on; in principle, it should be possible to check its L-space status quite easily.")
     raise Exception('I was not able to find the value in the census, this is very strange.')
 
@@ -160,54 +394,338 @@ def second_minimal_vol(M, max_coeff):
     
 
 
-def order_curves_by_volume(curves, M, init_string=''):
-    #Drills the given curves, and sort them by increasing hyperbolic volume of the drilled manifold.
-    #It also tries to identify the drilled manifolds (and using that, the L-space value of M).
+class DrillingCandidate:
+    #A closed geodesic of M that can be drilled: either a dual curve of the triangulation or a word in the fundamental
+    #group (from the length spectrum). length is its complex length.
+    def __init__(self, length, curve=None, word=None):
+        self.length=length
+        self.curve=curve
+        self.word=word
+    def drill(self, M):
+        if self.curve is not None:
+            return M.drill(self.curve)
+        return M.drill_word(self.word)
+    def __repr__(self):
+        if self.curve is not None:
+            return "DrillingCandidate(length="+str(self.length)+", curve="+str(self.curve)+")"
+        return "DrillingCandidate(length="+str(self.length)+", word="+str(self.word)+")"
+
+
+def drill(M, curve):
+    #curve can be a dual curve of M or a DrillingCandidate
+    if isinstance(curve, DrillingCandidate):
+        return curve.drill(M)
+    return M.drill(curve)
+
+
+def same_complex_length(length, other, tolerance=0.000001):
+    #True if the two complex lengths are the same up to the orientation of the geodesic (which conjugates the length),
+    #the torsion (the imaginary part) being defined only modulo 2*pi
+    if abs(float(length.real())-float(other.real())) > tolerance:
+        return False
+    torsion=float(length.imag())
+    other_torsion=float(other.imag())
+    return any(abs(math.remainder(torsion-sign*other_torsion, 2*math.pi)) <= tolerance for sign in [1,-1])
+
+
+def geodesic_candidates(M, max_segms=6, length_cutoff=None):
+    """
+    Returns the closed geodesics of M to drill, sorted by length (the volume of the drilling grows with the length of
+    the geodesic, at least for short geodesics), without drilling them. The geodesics are the dual curves of M with at
+    most max_segms segments and the ones in the length spectrum of M up to length_cutoff, which by default is the length
+    of the longest dual curve. A geodesic of the length spectrum with the same complex length of a dual curve, with the
+    torsion modulo 2*pi (see same_complex_length), is considered the same geodesic. The words of the latter are in the
+    generators of the unsimplified fundamental group, as drill_word needs:
+
+    >>> M=Manifold('m004(1,2)')
+    >>> G=M.fundamental_group(False)
+    >>> candidates=[c for c in geodesic_candidates(M, max_segms=2, length_cutoff=2.5) if c.word is not None]
+    >>> len(candidates) > 0
+    True
+    >>> all(abs(G.complex_length(c.word).real()-c.length.real()) < 0.000001 for c in candidates)
+    True
+    >>> all(drill(M, c).num_cusps()==2 for c in candidates)
+    True
+    >>> duals=[c for c in geodesic_candidates(M, max_segms=2, length_cutoff=2.5) if c.word is None]
+    >>> any(same_complex_length(c.length, d.length) for c in candidates for d in duals)
+    False
+    """
+    candidates=[DrillingCandidate(c.filled_length, curve=c) for c in M.dual_curves(max_segments=max_segms)]
+    if length_cutoff is None:
+        length_cutoff=max([float(c.length.real()) for c in candidates]+[1.0])
+    try:
+        #Unlike the ones of length_spectrum, which are in the generators of the Dirichlet domain, the words of
+        #length_spectrum_alt are in the unsimplified fundamental group
+        spectrum=[(g.length, g.word) for g in M.length_spectrum_alt(max_len=length_cutoff)]
+    except:
+        spectrum=[]
+    for (length, word) in spectrum:
+        if not any(same_complex_length(length, c.length) for c in candidates):
+            candidates.append(DrillingCandidate(length, word=word))
+    return sorted(candidates, key=lambda c: float(c.length.real()))
+
+
+def curve_length(curve):
+    #The complex length of a dual curve or of a DrillingCandidate
+    if isinstance(curve, DrillingCandidate):
+        return curve.length
+    return curve.filled_length
+
+
+def curve_keys(curves):
+    #The keys of the curves in a DrillingCache: their complex lengths, rounded, with the torsion in [0, pi] since it does
+    #not depend on the orientation. The curves with the same key as another one are not cached, and get the key None.
+    keys=[]
+    for curve in curves:
+        length=curve_length(curve)
+        torsion=abs(math.remainder(float(length.imag()), 2*math.pi))
+        keys.append("%.6f,%.6f" % (float(length.real()), torsion))
+    return [key if keys.count(key)==1 else None for key in keys]
+
+
+def identify_drilling(N):
+    #Identifies the one-cusped manifold N with a QHT of the census, and returns the name of the filling of that QHT along
+    #the slope (1,0) of N (e.g. "v3257(-3,2)"), or None. We use the signature index of the census if it was built, and
+    #Manifold.identify() for the manifolds not found there (see identify_QHT in census.py).
+    found=identify_QHT(N)
+    if found is None:
+        return None
+    [name, X]=found
+    B=N.is_isometric_to(X, return_isometries=True)
+    new_filling=tuple(B[0].cusp_maps()[0]*vector((1,0)))
+    return name+"(%d,%d)" % new_filling
+
+
+def evaluate_drilling(M, curve):
+    #Drills curve in M and computes what drillings_by_volume needs to know about the drilling: whether it could be drilled,
+    #the census name of M and its L-space value if the drilled manifold is identified in the census, otherwise whether the
+    #drilling is hyperbolic, its solution type and its isosig and volume. Returns this record and the drilled manifold (or None).
+    ans={'drilled': False, 'census': None, 'allowed_solution_type': list(allowed_solution_type)}
+    try:
+        with stage('drill'):
+            N=drill(M, curve)
+            N=N.filled_triangulation()
+    except:
+        #Some geodesics of the length spectrum are not simple
+        return [ans, None]
+    ans['drilled']=True
+    work_done['drillings']+=1
+    #We try to identify the drilled manifold
+    try:
+        with stage('identify'):
+            found=identify_drilling(N)
+        if found is not None:
+            ans['census_value']=int(search_in_census_if_L_space([found]))
+            ans['census']=found
+            return [ans, None]
+    except:
+        pass
+    [a,N]=is_hyperbolic(N)
+    ans['hyperbolic']=a
+    ans['solution_type']=int(N.solution_type(enum=True))
+    if a:
+        ans['isosig']=N.triangulation_isosig(decorated=True)
+        ans['volume']=float(N.volume())
+    return [ans, N]
+
+
+def drillings_by_volume(curves, M, init_string='', details=None, drilling_cache=None):
+    #A generator version of order_curves_by_volume: drills the given curves one at a time, and yields the pairs
+    #(curve, drilled manifold) of the hyperbolic drillings in the order of order_curves_by_volume.
+    #If a drilled manifold is identified in the census, it yields the L-space value of M instead, and stops.
+    #If details is a dictionary, the census manifold isometric to M (if found) is saved there, under 'census'.
+    #If drilling_cache is given (a path or a DrillingCache), the drillings already evaluated (see evaluate_drilling) are read
+    #from there, keyed by the isometry signature of M and the complex length of the curve, and the new ones are saved there.
 
     #We do this so M does not change outside the function
     M=M.copy()
     [a,M]=is_hyperbolic(M)
-    
-    volumes_drilled=[]
-    to_pop=[]
-    for k in range(0,len(curves)):
-        curve=curves[k]
-        N=M.drill(curve)
-        N=N.filled_triangulation()
-        #We try to identify the drilled manifold
-        try:
-            ids=N.identify()
-            if not ids == []:
-                if not str(ids[0]).startswith("ocube") and  not str(ids[0]).startswith("odod") and not str(ids[0]).startswith("oicocl"):
-                    X=Manifold(ids[0])
-                    B=N.is_isometric_to(X, return_isometries=True)
-                    new_filling=tuple(B[0].cusp_maps()[0]*vector((1,0)))
-                    Manifold_found=ids[0]
-                    Manifold_found.dehn_fill(new_filling)
-                    is_L_space=search_in_census_if_L_space(ids)
-                    print (init_string+': '+M.name()+' is '+str(ids[0])+', whose L-space value is known to be '+str(is_L_space))
-                    return int(is_L_space)
-        except:
-            pass
-        [a,N]=is_hyperbolic(N)
-        if not a:
-            to_pop.append(k)
+
+    drilling_cache=as_drilling_cache(drilling_cache)
+    signature=None
+    if drilling_cache is not None:
+        signature=isometry_signature(M)
+    if signature is not None:
+        keys=curve_keys(curves)
+    else:
+        keys=[None]*len(curves)
+
+    for curve, key in zip(curves, keys):
+        record=None
+        N=None
+        if key is not None:
+            record=drilling_cache.lookup(signature, key)
+            if record is not None and not is_usable_drilling_record(record):
+                record=None
+        if record is not None and record['drilled'] and record['census'] is None and record['hyperbolic']:
+            #We rebuild the drilled manifold; if is_hyperbolic does not accept its solution, we drill it again
+            [a,N]=is_hyperbolic(Manifold(record['isosig']))
+            if not a:
+                record=None
+                N=None
+        if record is None:
+            [record, N]=evaluate_drilling(M, curve)
+            if key is not None:
+                drilling_cache.record(signature, key, record)
+        if not record['drilled']:
+            continue
+        if record['census'] is not None:
+            print (init_string+': '+M.name()+' is '+record['census']+', whose L-space value is known to be '+str(record['census_value']))
+            if details is not None:
+                details['census']=record['census']
+            yield record['census_value']
+            return
+        #We do not consider the drillings that are not hyperbolic
+        if record['hyperbolic']:
+            yield (curve, N)
+
+
+def order_curves_by_volume(curves, M, init_string='', details=None, drilling_cache=None):
+    #Drills the given curves, and returns the ones whose drilling is hyperbolic.
+    #It also tries to identify the drilled manifolds (and using that, the L-space value of M, which is returned instead).
+    #If details is a dictionary, the census manifold isometric to M (if found) is saved there, under 'census'.
+    #The drilled manifolds are not sorted by volume: the order of dual_curves (by length of the curves) is kept.
+    ans=[]
+    for drilling in drillings_by_volume(curves, M, init_string, details=details, drilling_cache=drilling_cache):
+        if isinstance(drilling, int):
+            return drilling
+        ans.append(drilling[0])
+    return ans
+
+
+@timed('identify')
+def census_identification(M):
+    #Returns the name of the manifold of the census isometric to M, or None if it was not found
+    try:
+        ids=M.identify()
+    except:
+        return None
+    if not ids == []:
+        if not str(ids[0]).startswith("ocube") and  not str(ids[0]).startswith("odod") and not str(ids[0]).startswith("oicocl"):
+            return str(ids[0])
+    return None
+
+
+@timed('filling')
+def evaluate_filling(N, slope, avoid=None):
+    #Fills N along slope and computes what search_for_minimal_volume_fillings needs to know about the filling:
+    #whether it is hyperbolic, its invariants and its census identification. The filling is not identified if its
+    #invariants are in avoid, since it is not going to be used.
+    M=N.copy()
+    M.dehn_fill(slope,0)
+    [a,M]=is_hyperbolic(M)
+    ans={'slope': slope, 'hyperbolic': a, 'manifold': M, 'solution_type': int(M.solution_type(enum=True))}
+    if a:
+        ans['inv']=man_inv(M)
+        if avoid is not None and inside_man_inv(ans['inv'], avoid):
+            ans['avoided']=True
+        else:
+            ans['census']=census_identification(M)
+    return ans
+
+
+def filling_record(result):
+    #The result of evaluate_filling (for a filling that was not avoided) as a JSON-serializable dictionary, as sent
+    #back by the worker processes and saved in a FillingCache
+    ans={'slope': [int(result['slope'][0]), int(result['slope'][1])], 'hyperbolic': result['hyperbolic'],
+         'solution_type': result['solution_type'], 'allowed_solution_type': list(allowed_solution_type)}
+    if result['hyperbolic']:
+        ans['volume']=float(result['inv'].volume)
+        ans['homology']=str(result['inv'].homology)
+        ans['census']=result['census']
+        ans['census_value']=None
+        if result['census'] is not None:
+            try:
+                ans['census_value']=qht_census().L_space_value(*split_census_name(result['census']))
+            except:
+                pass
+        if 'manifold' in result:
+            ans['isosig']=result['manifold'].triangulation_isosig(decorated=True)
         else:
-            volumes_drilled.append(N.volume())
-    #We do not consider the drillings that are not hyperbolic
-    if to_pop!=[]:
-        to_pop.reverse()
-        for h in to_pop:
-            curves.pop(h)
-    h=list(range(0,len(volumes_drilled)))
-    orders=[x for y, x in sorted(zip(volumes_drilled, h))]
-    return [x for y, x in sorted(zip(h, curves))]
-
-
-def search_for_minimal_volume_fillings(M, non_L_space_interval, max_coefficient=15, init_string="", already_found_inv_fill=[]):
+            ans['isosig']=result['isosig']
+    return ans
+
+
+def is_usable_record(record):
+    #A record saved with a different allowed_solution_type can be used only if is_hyperbolic would give the same answer
+    if record['hyperbolic']:
+        return record['solution_type'] in allowed_solution_type
+    return set(allowed_solution_type) <= set(record['allowed_solution_type'])
+
+
+def is_usable_drilling_record(record):
+    #The records of the drillings identified in the census, or that could not be drilled, do not depend on
+    #allowed_solution_type; the other ones are used as in is_usable_record
+    if not record['drilled'] or record['census'] is not None:
+        return True
+    if 'allowed_solution_type' not in record:
+        #The record was saved without the solution types
+        return False
+    return is_usable_record(record)
+
+
+def result_from_record(record):
+    #The inverse of filling_record; the filled manifold is rebuilt from the isosig only if needed (see filling_manifold)
+    ans=dict(record, slope=tuple(record['slope']))
+    if record['hyperbolic']:
+        ans['inv']=man_inv(volume=record['volume'], homology=record['homology'])
+    return ans
+
+
+_filling_manifolds={}
+
+def _evaluate_filling_from_handle(args):
+    #The version of evaluate_filling run by the worker processes: the manifold is given by a ManifoldHandle (see
+    #handle.py), so all the workers use the hyperbolic structure solved in the parent, and the result is sent back as
+    #a record (see filling_record)
+    handle, slope=args
+    if handle.triangulation not in _filling_manifolds:
+        _filling_manifolds[handle.triangulation]=handle.manifold()
+    return filling_record(evaluate_filling(_filling_manifolds[handle.triangulation], slope))
+
+
+def filling_slopes(max_coefficient):
+    #The slopes considered by search_for_minimal_volume_fillings, up to sign
+    slopes=[]
+    for h in range(-max_coefficient, max_coefficient+1):
+        for k in range (0, max_coefficient+1):
+            if gcd(h,k)==1 and (h,k)!=(-1,0):
+                slopes.append((h,k))
+    return slopes
+
+
+_persistent_non_L_slopes={}
+
+def persistent_non_L_fillings(T, max_coefficient, tries=0):
+    #The slopes of filling_slopes(max_coefficient) along which the filling of T has a taut foliation, found with one
+    #search of persistently foliar orientations of T (see refutation.py). We remember them, since both the intervals of
+    #a double interval use them.
+    key=(T.triangulation_isosig(decorated=True), max_coefficient, tries)
+    if key not in _persistent_non_L_slopes:
+        with stage('persistent foliations'):
+            _persistent_non_L_slopes[key]=persistent_non_L_slopes(T, filling_slopes(max_coefficient), tries)
+    return _persistent_non_L_slopes[key]
+
+
+@timed('fillings')
+def search_for_minimal_volume_fillings(M, non_L_space_interval, max_coefficient=15, init_string="", already_found_inv_fill=[], details=None, volume_prefilter=False, processes=1, filling_cache=None, non_L_slopes=None, transpositions=None):
 #This function takes a manifold M with one cusp and a candidate interval to be the
 #L-space interval (the complementary of non_L_space_interval) and searches for
 #the two dehn fillings in that interval that minimizes the volume.
+#If details is a dictionary, the two fillings found and their census identifications (or None) are saved there.
+#If volume_prefilter is True, the slopes are filled by increasing length on the maximal cusp, and we stop as soon as
+#the lower bound on the volume of the remaining fillings (see cusp_geometry.py) exceeds the second minimal volume found.
+#Since not all the slopes are filled, census hits among the remaining slopes are not found.
+#The bound holds only for the hyperbolic structure of M, hence we do this only if the solution of M is geometric.
+#If processes>1, the fillings are computed by a pool of processes; the results are then considered in the same order
+#as in the serial version, so the fillings selected are the same.
+#If filling_cache is given (a path or a FillingCache), the fillings already evaluated in previous runs are read from there,
+#and the new ones are saved there.
+#If non_L_slopes is given, the fillings along these slopes are known not to be L-spaces (e.g. by persistent_non_L_fillings).
+#If one of them is in the possible L-space interval, that interval is not the L-space interval of M: we return no fillings,
+#with L-space values -1 as for a non L-space found in the census, and the slope is saved in details['non_L_slope'].
+#The fillings whose invariants are in already_found_inv_fill are not considered, unless they are proved L-spaces in the
+#transposition_table transpositions; then is_certified_L_space reuses their proof.
 
     #We do this so M does not change outside the function
     M=M.copy()
@@ -219,71 +737,164 @@ def search_for_minimal_volume_fillings(M, non_L_space_interval, max_coefficient=
     N=M.copy()
     vol_min=100000
     vol_min_2=100000
-    N_1=N.copy()
-    N_2=N.copy()
+    filling_1=None
+    filling_2=None
     minimizing_fillings=[(0,0),(0,0)]
     found_1_L_space=0
     found_2_L_space=0
+    census_found=[None, None]
+
+    #The slopes in the possible L-space interval
+    slopes=[(h,k) for (h,k) in filling_slopes(max_coefficient) if Slope(h,k) not in non_L_space_interval]
+    if non_L_slopes is not None:
+        refuting=[slope for slope in slopes if slope in non_L_slopes]
+        if len(refuting) > 0:
+            print(init_string+": The manifold " + N.name() +" filled with " + str(refuting[0]) + " has a taut foliation, hence the L-space interval is not this one.")
+            if details is not None:
+                details['fillings']=[refuting[0], refuting[0]]
+                details['census']=[None, None]
+                details['non_L_slope']=refuting[0]
+            return([None, None, -1, -1])
+    lower_bounds=None
+    if volume_prefilter and N.solution_type()=='all tetrahedra positively oriented':
+        try:
+            [slopes, lower_bounds]=order_slopes_by_volume_bound(N, slopes)
+        except Exception:
+            #If the cusp shape could not be computed, we fill all the slopes
+            lower_bounds=None
+
+    #The fillings evaluated in previous runs
+    results=[None]*len(slopes)
+    filling_cache=as_filling_cache(filling_cache)
+    signature=None
+    if filling_cache is not None:
+        signature=isometry_signature(N, of_link=True)
+    if signature is not None:
+        for i in range(len(slopes)):
+            record=filling_cache.lookup(signature, slopes[i])
+            if record is not None and is_usable_record(record):
+                results[i]=result_from_record(record)
+
+    if processes > 1:
+        N_handle=ManifoldHandle.from_manifold(N)
+        missing=[i for i in range(len(slopes)) if results[i] is None]
+        records=map_in_parallel(_evaluate_filling_from_handle, [(N_handle, slopes[i]) for i in missing], processes)
+        work_done['fillings']+=len(missing)
+        for i, record in zip(missing, records):
+            results[i]=result_from_record(record)
+            if signature is not None:
+                filling_cache.record(signature, slopes[i], record)
 
     #We now look for minimal volume fillings
-    for h in range(-max_coefficient, max_coefficient+1):
-        for k in range (0, max_coefficient+1):
-            if gcd(h,k)==1 and (h,k)!=(-1,0):
-                slope=Slope(h,k)
-                if slope not in non_L_space_interval:
-                    M=N.copy()
-                    M.dehn_fill((h,k),0)
-                    [a,M]=is_hyperbolic(M)
-                    if a:
-                        if not inside_man_inv( man_inv(M), already_found_inv_fill ):
-                            #Here we try to look in the census if the filling was already known
-                            try:
-                                ids=M.identify()
-                                if not ids == []:
-                                    if not str(ids[0]).startswith("ocube") and  not str(ids[0]).startswith("odod") and not str(ids[0]).startswith("oicocl"):
-                                        if found_1_L_space==0:
-                                            x=search_in_census_if_L_space(ids)
-                                            print(init_string+"1: The manifold " + M.name() +" filled with " + str((h,k)) + " is " +str(ids) + ", its L-space value is " + str(x))
-                                            found_1_L_space=int(x)
-                                            M_vol=0.1
-                                        elif found_2_L_space==0:
-                                            x=search_in_census_if_L_space(ids)
-                                            print(init_string+"2: Found in fillings another one: the manifold " + M.name() +" filled with " + str((h,k)) + " is "+str(ids)+ ": its L-space value is " + str(x))
-                                            found_2_L_space=int(x)
-                                            M_vol=0.2
-                                else:
-                                    M_vol=M.volume()
-                            except:
-                                M_vol=M.volume()
-
-                            if M_vol < vol_min:
-                                vol_min_2=vol_min
-                                vol_min=M_vol
-                                minimizing_fillings[1]=minimizing_fillings[0]
-                                minimizing_fillings[0]=(h,k)
-                                N_2=N_1.copy()
-                                N_1=M.copy()
-                            elif M_vol < vol_min_2:
-                                vol_min_2=M_vol
-                                minimizing_fillings[1]=(h,k)
-                                N_2=M.copy()
+    for i in range(len(slopes)):
+        (h,k)=slopes[i]
+        if lower_bounds is not None and lower_bounds[i] >= vol_min_2:
+            print(init_string+": The remaining "+str(len(slopes)-i)+" fillings have larger volume, we do not compute them.")
+            break
+        result=results[i]
+        if result is None:
+            work_done['fillings']+=1
+            if signature is None:
+                result=evaluate_filling(N, (h,k), avoid=already_found_inv_fill)
+            else:
+                result=evaluate_filling(N, (h,k))
+                filling_cache.record(signature, (h,k), filling_record(result))
+        if not result['hyperbolic']:
+            continue
+        if result.get('avoided', False) or inside_man_inv(result['inv'], already_found_inv_fill):
+            if transpositions is None or not transpositions.proved(transpositions.key(filling_manifold(N, result))):
+                continue
+            print(init_string+": The manifold " + N.name() +" filled with " + str((h,k)) + " was already proved to be an L-space in this run")
+            result=dict(result, census=result.get('census'))
+        M_vol=None
+        #Here we try to look in the census if the filling was already known
+        if result['census'] is not None:
+            ids=[result['census']]
+            try:
+                if found_1_L_space==0:
+                    x=search_in_census_if_L_space(ids)
+                    print(init_string+"1: The manifold " + N.name() +" filled with " + str((h,k)) + " is " +str(ids).replace("'","") + ", its L-space value is " + str(x))
+                    found_1_L_space=int(x)
+                    census_found[0]=ids[0]
+                    M_vol=0.1
+                elif found_2_L_space==0:
+                    x=search_in_census_if_L_space(ids)
+                    print(init_string+"2: Found in fillings another one: the manifold " + N.name() +" filled with " + str((h,k)) + " is "+str(ids).replace("'","")+ ": its L-space value is " + str(x))
+                    found_2_L_space=int(x)
+                    census_found[1]=ids[0]
+                    M_vol=0.2
+            except:
+                pass
+        if M_vol is None:
+            M_vol=result['inv'].volume
+
+        if M_vol < vol_min:
+            vol_min_2=vol_min
+            vol_min=M_vol
+            minimizing_fillings[1]=minimizing_fillings[0]
+            minimizing_fillings[0]=(h,k)
+            filling_2=filling_1
+            filling_1=result
+        elif M_vol < vol_min_2:
+            vol_min_2=M_vol
+            minimizing_fillings[1]=(h,k)
+            filling_2=result
     if minimizing_fillings[1]==(0,0):
         raise Exception("I could not find two fillings in the interval. Try raising max_coefficient.")
+    [N_1, N_2]=[filling_manifold(N, filling) for filling in [filling_1, filling_2]]
     N_1.set_name(N.name() + str(minimizing_fillings[0]) )
     N_2.set_name(N.name() + str(minimizing_fillings[1]) )
+    if details is not None:
+        details['fillings']=minimizing_fillings
+        details['census']=census_found
     return([N_1, N_2, found_1_L_space, found_2_L_space])
 
 
+def filling_manifold(N, result):
+    #The filled manifold of a result of evaluate_filling; if it was computed in another process, we rebuild it from its isosig
+    if 'manifold' in result:
+        return result['manifold'].copy()
+    M=ManifoldHandle(result['isosig'], [tuple(result['slope'])]).manifold()
+    [a,M]=is_hyperbolic(M)
+    return M
+
+
+
+def alexander_could_be_floer_simple(N):
+    #A cheap necessary condition for TuraevTorsion(N).could_be_floer_simple(), when H_1(N)=Z. Then the torsion is
+    #Delta/(1-t), where Delta is the Alexander polynomial, normalized so that Delta(1)=1; hence its coefficients are
+    #0 or 1 exactly when the partial sums of the coefficients of Delta are 0 or 1, that is when the nonzero coefficients
+    #of Delta are 1, -1, 1, ..., -1, 1 (see also add_alex in foliar/cluster_scripts/run_knots.py).
+    #When H_1(N) has torsion or the Alexander polynomial can not be computed, it returns True.
+    try:
+        if N.homology().elementary_divisors()!=[0]:
+            return True
+        coeffs=list(N.alexander_polynomial().coefficients())
+    except:
+        return True
+    if abs(sum(coeffs))!=1:
+        return True
+    if sum(coeffs)<0:
+        coeffs=[-c for c in coeffs]
+    return coeffs==(len(coeffs)//2)*[1,-1]+[1]
+
 
-def search_for_minimal_volume_drillings_floer_simple(M, curves=None, init_string='', max_drills=10, max_segms=6, already_found_inv_dr=[]):
+@timed('drillings')
+def search_for_minimal_volume_drillings_floer_simple(M, curves=None, init_string='', max_drills=10, max_segms=6, already_found_inv_dr=[], drillings=None, alexander_prefilter=True):
 #This function searches for drillings that minimize volume
+#If alexander_prefilter is True, the drillings whose Alexander polynomial shows that they are not Floer simple
+#(see alexander_could_be_floer_simple) are discarded before computing their Turaev torsion.
+#If drillings is given (see drillings_by_volume), the drilled manifolds are taken from there, and only as many as needed
+#are computed; if it yields the L-space value of M, that value is returned.
 
     #We do this so M does not change outside the function
     M=M.copy()
 
     #If dual curves were not given, we compute them
-    if curves==None:
+    if curves==None and drillings==None:
         curves=M.dual_curves(max_segments=max_segms)
+    if drillings==None:
+        drillings=((curve, None) for curve in curves)
 
     #We check if M is a hyperbolic manifold
     assert is_hyperbolic(M)[0]
@@ -292,20 +903,37 @@ def search_for_minimal_volume_drillings_floer_simple(M, curves=None, init_string
     minimizing_drilling=-1
     dictionary_volumes={}
     found_one=0
-    for ind in range(0, min(max_drills, len(curves))):
+    rejected_by_alexander=0
+    for ind, drilling in zip(range(0, max_drills), drillings):
+        if isinstance(drilling, int):
+            return drilling
         if found_one==0:
-            N=M.drill(curves[ind])
-            N=N.filled_triangulation()
-            [a,N]=is_hyperbolic(N)
+            [curve, N]=drilling
+            if N is None:
+                with stage('drill'):
+                    N=drill(M, curve)
+                    N=N.filled_triangulation()
+                [a,N]=is_hyperbolic(N)
+            else:
+                a=True
             if a:
                 if not( inside_man_inv( man_inv(N), already_found_inv_dr ) ) :
+                    if alexander_prefilter and not alexander_could_be_floer_simple(N):
+                        rejected_by_alexander=rejected_by_alexander+1
+                        continue
                     try:
                         print(init_string+": Computing Turaev torsion drilling...")
-                        tau=TuraevTorsion(N)
+                        work_done['torsions']+=1
+                        with stage('turaev_torsion'):
+                            tau=TuraevTorsion(N)
                         if tau.could_be_floer_simple():
                             found_one=1
                     except:
                         pass
+        if found_one==1:
+            break
+    if rejected_by_alexander>0:
+        print(init_string+": The Alexander polynomial showed that "+str(rejected_by_alexander)+" drillings are not Floer simple.")
     if found_one==0:
         M.dehn_fill((0,0))
         #print(M.isometry_signature())
@@ -319,36 +947,124 @@ def search_for_minimal_volume_drillings_floer_simple(M, curves=None, init_string
 
 
 
-def is_certified_L_space(Man, num_iter=0, max_iter=25, max_coefficient=17, max_segms=6, max_drills=10, init_string="", already_found_inv=[], T=None, tau_T=None, which_interval=2, only_true_hyperbolic_structures=False, save_QHT=False, path_save_QHT="./proofs/", curves_to_avoid=-1):
+def find_drilling(Man, init_string='', max_segms=6, max_drills=10, already_found_inv=[], curves_to_avoid=-1, lazy_drillings=False, rank_by_length=False, alexander_prefilter=True, details=None, drilling_cache=None):
+    #Looks for a curve of Man whose drilling T is hyperbolic, Floer simple and not already used, as is_certified_L_space
+    #does (see there for the parameters), and returns [T, tau_T, already_found_inv]. If a drilling is identified in the
+    #census, it returns the L-space value of Man instead, and if details is a dictionary the census manifold is saved there.
+    with stage('dual_curves'):
+        if rank_by_length:
+            curves_Man = geodesic_candidates(Man, max_segms=max_segms)
+        else:
+            curves_Man = Man.dual_curves(max_segments=max_segms)
+
+    #If curves to avoid is different from -1, we want to avoid some curves. This is usually done to "change the path" we are taking, to prove hard that a manifold is an L-space
+    if curves_to_avoid!=-1:
+        curves_Man=curves_Man[curves_to_avoid:]
+
+    drillings_Man = drillings_by_volume(curves_Man, Man, init_string, details=details, drilling_cache=drilling_cache)
+    if not (lazy_drillings or rank_by_length):
+        #We drill all the curves before looking for a Floer simple one, so that all the drillings are identified
+        drillings_Man = list(drillings_Man)
+        if drillings_Man and isinstance(drillings_Man[-1], int):
+            return drillings_Man[-1]
+        drillings_Man = iter(drillings_Man)
+    drilling = search_for_minimal_volume_drillings_floer_simple(Man, init_string=init_string, max_drills=max_drills, already_found_inv_dr=already_found_inv, drillings=drillings_Man, alexander_prefilter=alexander_prefilter)
+    return drilling
+
+
+@traced_node
+def is_certified_L_space(Man, num_iter=0, max_iter=25, max_coefficient=17, max_segms=6, max_drills=10, init_string="", already_found_inv=[], T=None, tau_T=None, which_interval=2, only_true_hyperbolic_structures=False, save_QHT=False, path_save_QHT="./proofs/", curves_to_avoid=-1, parallel_depth=0, store=None, certificate=None, cert_node=None, volume_prefilter=False, fill_processes=1, filling_cache=None, lazy_drillings=False, rank_by_length=False, alexander_prefilter=True, trace=None, drilling_cache=None, interval_order="AB", transpositions=None, refutation_time=None, persistent_foliation_tries=None):
     #The algorithm takes a QHS Man and tries to prove that it is an L-space. The answer True is rigorous, while the answer False is not.
+    #If parallel_depth>0, the branches of the first parallel_depth levels of the proof tree are evaluated in separate processes
+    #(see parallel.py); each level at most doubles the number of processes.
+    #If store is given (a path or an LSpaceStore), the L-space values found are recorded there and reused in later runs.
+    #If certificate is a Certificate, the proof of the answer True is saved there (see certificate.py); cert_node is the
+    #name of the node of Man in the certificate.
+    #If volume_prefilter is True, the minimal volume fillings are searched using the cusp geometry (see search_for_minimal_volume_fillings).
+    #If fill_processes>1, the fillings of each T are computed by a pool of fill_processes processes.
+    #If filling_cache is given (a path or a FillingCache), the evaluations of the fillings of each T are cached there across runs.
+    #If lazy_drillings is True, the curves are drilled only until a Floer simple drilling is found (see drillings_by_volume);
+    #then the census identification of the drillings is only tried on the curves drilled.
+    #If rank_by_length is True, the curves to drill are the short geodesics of Man given by geodesic_candidates, which are
+    #drilled lazily.
+    #If alexander_prefilter is True, the Alexander polynomial is used to discard some drillings before computing their
+    #Turaev torsion (see alexander_could_be_floer_simple).
+    #If trace is a Tracer, the time spent in each stage of the algorithm is recorded there for each node of the proof tree,
+    #and a summary is printed at the end (see tracing.py).
+    #If drilling_cache is given (a path or a DrillingCache), the drillings of the curves of Man are cached there across runs.
+    #If interval_order is "BA", when both the L-space intervals are possible the second one is tried first.
+    #The answers found for the manifolds met during the run are kept in a transposition_table, so that a manifold met
+    #again reuses its sub-proof (and the certificate becomes a DAG); pass transpositions=False to disable this.
+    #If refutation_time is given, before the recursion into the fillings M_1 and M_2 we search for a taut foliation of
+    #them for at most refutation_time seconds each (see refutation.py); if one is found, the branch fails at once. The
+    #fillings whose answer is already in the store or in the transposition table are not searched.
+    #If persistent_foliation_tries is given, the fillings of T with a taut foliation coming from a persistently foliar
+    #orientation of T (or of one of persistent_foliation_tries retriangulations of it) refute the L-space intervals containing them.
         
     #We need this because "list" is a mutable type, hence its value is mantained through multiple calls of the function
+    if cert_node is None:
+        cert_node="M"+init_string
+    work_done['max_depth']=max(work_done['max_depth'], num_iter)
     if num_iter==0:
         print("Inizializing...")
+        store=as_L_space_store(store)
+        filling_cache=as_filling_cache(filling_cache)
+        drilling_cache=as_drilling_cache(drilling_cache)
+        if certificate is not None:
+            certificate.root=cert_node
         if Man.homology().betti_number()!=0:
             raise Exception('The given manifold is not a rational homology sphere.')
         if not Man.is_orientable():
             raise Exception('M is not orientable.')
         try:
-            ids=Man.identify()
+            with stage('identify'):
+                ids=Man.identify()
             if not ids == []:
                 if not str(ids[0]).startswith("ocube") and  not str(ids[0]).startswith("odod") and not str(ids[0]).startswith("oicocl"):
                     x=search_in_census_if_L_space(ids)
                     print(init_string+"The manifold is in the census, its L-space value is " + str(x))
+                    if store is not None:
+                        store.record(Man, int(x), census=str(ids[0]))
+                    if certificate is not None and int(x)==1:
+                        certificate.add_census(cert_node, manifold_description(Man), ids[0])
                     return(my_boolean(int(x)))
         except:
             pass
-        already_found_inv=[]
-        global allowed_solution_type
-    
-        if only_true_hyperbolic_structures==True:
-            allowed_solution_type=[1]
-        else:
-            allowed_solution_type=[1,2]
+        already_found_inv=man_inv_index()
+        set_allowed_solution_type(only_true_hyperbolic_structures)
+        if transpositions is None:
+            transpositions=transposition_table()
+        elif transpositions is False:
+            transpositions=None
         
         
         
         Man.set_name('M')
+
+    #We check if the L-space value of Man was found in a previous run
+    if store is not None and which_interval==2:
+        with stage('store'):
+            x=store.lookup(Man)
+        if x is not None:
+            print(init_string+": "+Man.name()+" was found in the store, its L-space value is " + str(x))
+            if certificate is not None and x==1:
+                certificate.add_store(cert_node, manifold_description(Man))
+            return my_boolean(x)
+
+    #We check if Man was already met in this run
+    transposition_key=None
+    if transpositions is not None and which_interval==2:
+        transposition_key=transpositions.key(Man)
+        entry=transpositions.lookup(transposition_key, max_iter-num_iter)
+        if entry is not None and entry['value'] and certificate is not None:
+            #The certificate points to the children of the node of the first proof
+            if entry['cert_node'] in certificate.nodes:
+                certificate.add(cert_node, dict(certificate.nodes[entry['cert_node']], manifold=manifold_description(Man)))
+            else:
+                entry=None
+        if entry is not None:
+            print(init_string+": "+Man.name()+" was already met in this run, its L-space value is " + str(entry['value']))
+            return entry['value']
         
     #We add the invariants of Man to the list, in order to avoid Man in the subsequent calls of the function
     already_found_inv.append(man_inv(Man))
@@ -380,23 +1096,24 @@ def is_certified_L_space(Man, num_iter=0, max_iter=25, max_coefficient=17, max_s
 
 
         #We look for a curve to drill that gives a low-volume manifold and is turaev simple
-        curves_Man = Man.dual_curves(max_segments=max_segms)
-        
-        #If curves to avoid is different from -1, we want to avoid some curves. This is usually done to "change the path" we are taking, to prove hard that a manifold is an L-space
-        if curves_to_avoid!=-1:
-            curves_Man=curves_Man[curves_to_avoid:]
-        
-        curves_Man = order_curves_by_volume(curves_Man, Man, init_string)
+        census_details={}
+        drilling=find_drilling(Man, init_string=init_string, max_segms=max_segms, max_drills=max_drills, already_found_inv=already_found_inv, curves_to_avoid=curves_to_avoid, lazy_drillings=lazy_drillings, rank_by_length=rank_by_length, alexander_prefilter=alexander_prefilter, details=census_details, drilling_cache=drilling_cache)
         #Here we check if some drilled manifold was identified
-        if isinstance(curves_Man, int):
-            if curves_Man==1:
+        if isinstance(drilling, int):
+            if store is not None and drilling in [1,-1]:
+                store.record(Man, drilling)
+            if certificate is not None and drilling==1:
+                certificate.add_census(cert_node, manifold_description(Man), census_details['census'])
+            if drilling in [1,-1] and transpositions is not None:
+                transpositions.record(transposition_key, drilling==1, cert_node, max_iter-num_iter)
+            if drilling==1:
                 return True
-            elif curves_Man==-1:
+            elif drilling==-1:
                 return False
             else:
-                raise Exception("The L-space value in the census is "+str(curves_Man)+"; this is not expected.")
+                raise Exception("The L-space value in the census is "+str(drilling)+"; this is not expected.")
 
-        [T, tau_T, already_found_inv]= search_for_minimal_volume_drillings_floer_simple(Man, curves=curves_Man, init_string=init_string, max_drills=max_drills, already_found_inv_dr=already_found_inv)
+        [T, tau_T, already_found_inv]= drilling
         #TODO: if M is "simple" (in particular, if it is very fast to compute the turaev_torsion of the drilled manifolds), it could be a good idea
         #to sort the curves by the second minimal volume of the filling that we are going to use.
 
@@ -415,6 +1132,9 @@ def is_certified_L_space(Man, num_iter=0, max_iter=25, max_coefficient=17, max_s
     #We define the possible L-space interval to look at. If there is only one, it is easy to do. Otherwise, if which_interval is not 2, we know which one we want to choose.
     D=IotaInverseDtau(tau_T)
     A=D.possible_non_L_space_cones((1,0))
+    #The parameters shared by all the recursive calls
+    sub_kwargs=dict(num_iter=num_iter+1, max_iter=max_iter, max_coefficient=max_coefficient, max_segms=max_segms, max_drills=max_drills, already_found_inv=already_found_inv, save_QHT=save_QHT, path_save_QHT=path_save_QHT, parallel_depth=parallel_depth-1, store=store, certificate=certificate, volume_prefilter=volume_prefilter, fill_processes=fill_processes, filling_cache=filling_cache, lazy_drillings=lazy_drillings, rank_by_length=rank_by_length, alexander_prefilter=alexander_prefilter, trace=trace, drilling_cache=drilling_cache, interval_order=interval_order, transpositions=transpositions, refutation_time=refutation_time, persistent_foliation_tries=persistent_foliation_tries)
+
     #If we have two possible intervals, we try both the possibilities
     if len(A)==2:
         if which_interval==0:
@@ -423,21 +1143,132 @@ def is_certified_L_space(Man, num_iter=0, max_iter=25, max_coefficient=17, max_s
             non_L_sp_interval=A[1]
         else:
             print(init_string+": Double interval..")
-            return is_certified_L_space(Man, num_iter=num_iter+1, max_iter=max_iter, max_coefficient=max_coefficient, max_segms=max_segms, max_drills=max_drills, init_string=init_string+"A", already_found_inv=already_found_inv, T=T, tau_T=tau_T, which_interval=0, save_QHT=save_QHT, path_save_QHT=path_save_QHT) or is_certified_L_space(Man, num_iter=num_iter+1, max_iter=max_iter, max_coefficient=max_coefficient, max_segms=max_segms, max_drills=max_drills, init_string=init_string+"B", already_found_inv=already_found_inv, T=T, tau_T=tau_T, which_interval=1, save_QHT=save_QHT, path_save_QHT=path_save_QHT)
+            branches=[(is_certified_L_space, (Man,), dict(sub_kwargs, init_string=init_string+"A", T=T, tau_T=tau_T, which_interval=0, cert_node=cert_node)),
+                      (is_certified_L_space, (Man,), dict(sub_kwargs, init_string=init_string+"B", T=T, tau_T=tau_T, which_interval=1, cert_node=cert_node))]
+            if interval_order=="BA":
+                branches.reverse()
+            ans=record_certified(store, Man, evaluate_branches(branches, 'or', parallel_depth))
+            if transpositions is not None:
+                transpositions.record(transposition_key, ans, cert_node, max_iter-num_iter)
+            return ans
     else:
         non_L_sp_interval=A[0]
 
     #We get M_1 and M_2, the two fillings on T with lower volume that, if are L-spaces, prove that M is an L-space.
-    [M_1, M_2, found_1_L_space, found_2_L_space]=search_for_minimal_volume_fillings(T, non_L_space_interval=non_L_sp_interval, max_coefficient=max_coefficient, init_string=init_string, already_found_inv_fill=already_found_inv)
+    fillings_details={}
+    non_L_slopes=None
+    if persistent_foliation_tries is not None:
+        non_L_slopes=persistent_non_L_fillings(T, max_coefficient, persistent_foliation_tries)
+    [M_1, M_2, found_1_L_space, found_2_L_space]=search_for_minimal_volume_fillings(T, non_L_space_interval=non_L_sp_interval, max_coefficient=max_coefficient, init_string=init_string, already_found_inv_fill=already_found_inv, details=fillings_details, volume_prefilter=volume_prefilter, processes=fill_processes, filling_cache=filling_cache, non_L_slopes=non_L_slopes, transpositions=transpositions)
+
+    #A filling in the interval has a taut foliation: we record it as the other non L-spaces
+    if 'non_L_slope' in fillings_details:
+        F=T.copy()
+        F.dehn_fill(fillings_details['non_L_slope'])
+        if store is not None:
+            store.record(F, -1, foliation=True)
+        if transpositions is not None:
+            transpositions.record(transpositions.key(F), False, None, max_iter)
 
     #If we identified some dehn filling, our work is simpler:
     if found_2_L_space!=0:
-        return my_boolean(found_2_L_space) and my_boolean(found_1_L_space)
+        ans=my_boolean(found_2_L_space) and my_boolean(found_1_L_space)
+        children=[cert_node+"c1", cert_node+"c2"]
+    #If one of the fillings we should certify has a taut foliation, we do not recurse
+    elif refutation_time is not None and found_1_L_space>=0 and refuted_by_foliation([M_2] if found_1_L_space>0 else [M_2, M_1], init_string, refutation_time, store, transpositions, max_iter-num_iter-1):
+        ans=False
     elif found_1_L_space!=0:
-        return my_boolean(found_1_L_space) and is_certified_L_space(M_2, num_iter=num_iter+1, max_iter=max_iter, max_coefficient=max_coefficient, max_segms=max_segms, max_drills=max_drills, init_string=init_string+"2", already_found_inv=already_found_inv, save_QHT=save_QHT, path_save_QHT=path_save_QHT)
+        ans=my_boolean(found_1_L_space) and is_certified_L_space(M_2, init_string=init_string+"2", **sub_kwargs)
+        children=[cert_node+"c1", "M"+init_string+"2"]
     #Otherwise we need to check both M_1 and M_2
     else:
-        return is_certified_L_space(M_2, num_iter=num_iter+1, max_iter=max_iter, max_coefficient=max_coefficient, max_segms=max_segms, max_drills=max_drills, init_string=init_string+"1", already_found_inv=already_found_inv, save_QHT=save_QHT, path_save_QHT=path_save_QHT) and is_certified_L_space(M_1, num_iter=num_iter+1, max_iter=max_iter, max_coefficient=max_coefficient, max_segms=max_segms, max_drills=max_drills, init_string=init_string+"2", already_found_inv=already_found_inv, save_QHT=save_QHT, path_save_QHT=path_save_QHT)
+        branches=[(is_certified_L_space, (M_2,), dict(sub_kwargs, init_string=init_string+"1")),
+                  (is_certified_L_space, (M_1,), dict(sub_kwargs, init_string=init_string+"2"))]
+        ans=evaluate_branches(branches, 'and', parallel_depth)
+        children=["M"+init_string+"2", "M"+init_string+"1"]
+
+    if certificate is not None and ans:
+        T_isosig=T.triangulation_isosig(decorated=True)
+        fillings=fillings_details['fillings']
+        for i in range(2):
+            if fillings_details['census'][i] is not None:
+                certificate.add_census(children[i], filling_description(T_isosig, fillings[i]), fillings_details['census'][i])
+        certificate.add_drilling(cert_node, manifold_description(Man), T_isosig, D, fillings, children)
+    if transpositions is not None and which_interval==2:
+        transpositions.record(transposition_key, ans, cert_node, max_iter-num_iter)
+    return record_certified(store, Man, ans)
+
+
+def refuted_by_foliation(Mans, init_string="", refutation_time=10, store=None, transpositions=None, iterations_left=None):
+    #Returns True if foliar finds a taut foliation of one of the manifolds Mans within refutation_time seconds (see
+    #refutation.py): that manifold is not an L-space, hence the branch of the proof tree through it fails.
+    #The manifolds whose answer is in the store or in the transposition table (for iterations_left iterations) are not
+    #searched, since is_certified_L_space finds their answer there; the ones refuted are recorded in both.
+    for N in Mans:
+        if store is not None and store.lookup(N) is not None:
+            continue
+        key=None
+        if transpositions is not None:
+            key=transpositions.key(N)
+            if transpositions.lookup(key, iterations_left) is not None:
+                continue
+        with stage('refutation'):
+            found=has_taut_foliation(N, time_limit=refutation_time)
+        if found:
+            print(init_string+": "+N.name()+" has a taut foliation, hence it is not an L-space")
+            if store is not None:
+                store.record(N, -1, foliation=True)
+            if transpositions is not None:
+                #This answer does not depend on the iterations left
+                transpositions.record(key, False, None, float('inf'))
+            return True
+    return False
+
+
+#The strategies raced by default by is_certified_L_space_portfolio: the changes of the parameters of is_certified_L_space
+#that were needed by hand in the proofs of the right-angled dodecahedral manifolds, and a few more
+default_portfolio=[{}, {'interval_order': 'BA'}]+[{'curves_to_avoid': k} for k in range(1, 9)]+[{'max_segms': 8, 'max_drills': 20}]
+
+
+def _run_strategy(Man, strategy, **kwargs):
+    #A strategy that fails with an exception just loses the race
+    print("Strategy "+str(strategy))
+    try:
+        return is_certified_L_space(Man, **dict(kwargs, **strategy))
+    except Exception as e:
+        print("Strategy "+str(strategy)+" failed: "+str(e))
+        return False
+
+
+def is_certified_L_space_portfolio(Man, strategies=None, processes=None, **kwargs):
+    #Runs is_certified_L_space(Man, **kwargs) with the changes of the parameters given by each strategy (a dictionary,
+    #e.g. {'curves_to_avoid': 5}), each in its own process, at most processes at a time (default: all of them). As soon
+    #as one of them certifies that Man is an L-space, the others are cancelled and True is returned. The output and the
+    #certificate are the ones of that strategy; a strategy that raises an exception counts as a failure.
+    if strategies is None:
+        strategies=default_portfolio
+    branches=[(_run_strategy, (Man, strategy), kwargs) for strategy in strategies]
+    return evaluate_in_parallel(branches, 'or', ordered=False, max_processes=processes)
+
+
+def record_certified(store, Man, value):
+    #If Man was certified to be an L-space, we record it in the store; value is returned unchanged
+    if store is not None and value:
+        store.record(Man, 1)
+    return value
+
+
+def evaluate_branches(branches, operator, parallel_depth=0):
+    #Evaluates "branches[0] operator branches[1] ...", where operator is 'and' or 'or' and each branch is a triple
+    #(function, args, kwargs). The evaluation is short-circuited as in python, and done in parallel if parallel_depth>0.
+    if parallel_depth > 0:
+        return evaluate_in_parallel(branches, operator)
+    decisive = (operator == 'or')
+    for function, args, kwargs in branches:
+        value = function(*args, **kwargs)
+        if bool(value) == decisive:
+            return value
+    return value
 
 #The following function was used to check the correctness of the algorithm, it can be ignored
 def is_coherent_possible_L_space_cone(T, fill1, fill2):
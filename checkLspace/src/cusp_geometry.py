@@ -0,0 +1,80 @@
+"""
+Estimates of the volumes of the Dehn fillings of a one-cusped hyperbolic
+manifold from the shape of its maximal cusp, computed for many slopes at
+once with NumPy.
+
+If the slope s has length l(s) > 2*pi on the maximal cusp of M, then by
+Futer, Kalfagianni and Purcell (Dehn filling, volume, and the Jones
+polynomial, 2008)
+
+    vol(M(s)) >= (1 - (2*pi/l(s))**2)**(3/2) * vol(M),
+
+while asymptotically (Neumann-Zagier) vol(M(s)) = vol(M) - pi**2/L(s)**2
+where L(s) = l(s)/sqrt(area of the cusp) is the normalized length. Both
+are increasing in l(s), hence by filling the slopes in order of length we
+know when no further slope can have a smaller volume.
+
+The lengths are computed from the cusp of the solution of the gluing
+equations of M, hence the bound is certain only if that solution is
+geometric; with a nongeometric or flat solution the cusp shape is not
+the one of the hyperbolic structure.
+"""
+
+import numpy
+from math import pi
+
+
+def cusp_shape_data(M):
+    #The translations of the meridian and the longitude of the maximal cusp of M, as complex numbers
+    m, l = M.cusp_translations()[0]
+    return complex(m), complex(l)
+
+
+def slope_lengths(M, slopes):
+    """
+    The lengths of the given slopes (a list of pairs (p, q)) on the
+    maximal cusp of M.
+    """
+    m, l = cusp_shape_data(M)
+    S = numpy.array(slopes, dtype=float).reshape(-1, 2)
+    return numpy.abs(S[:, 0]*m + S[:, 1]*l)
+
+
+def normalized_slope_lengths(M, slopes):
+    m, l = cusp_shape_data(M)
+    area = abs((m.conjugate()*l).imag)
+    return slope_lengths(M, slopes)/numpy.sqrt(area)
+
+
+def predicted_filling_volumes(M, slopes):
+    #The asymptotic (Neumann-Zagier) volumes of the fillings of M along the given slopes
+    L = normalized_slope_lengths(M, slopes)
+    return float(M.volume()) - pi**2/L**2
+
+
+def filling_volume_lower_bounds(M, slopes):
+    """
+    The lower bounds of Futer, Kalfagianni and Purcell for the volumes of
+    the fillings along the given slopes (0 for slopes of length at most
+    2*pi).
+    """
+    lengths = slope_lengths(M, slopes)
+    ans = numpy.zeros(len(lengths))
+    long_slopes = lengths > 2*pi
+    ans[long_slopes] = float(M.volume())*(1 - (2*pi/lengths[long_slopes])**2)**1.5
+    return ans
+
+
+def order_slopes_by_volume_bound(M, slopes):
+    """
+    Sorts the slopes by increasing predicted (Neumann-Zagier) volume of
+    the filling, and returns them together with the lower bounds of the
+    volumes of their fillings.  The prediction is increasing in the
+    length of the slope on the maximal cusp, as the lower bound is, hence
+    the lower bounds are then non-decreasing.
+    """
+    if len(slopes) == 0:
+        return [[], []]
+    order = numpy.argsort(predicted_filling_volumes(M, slopes), kind='stable')
+    bounds = filling_volume_lower_bounds(M, slopes)
+    return [[slopes[i] for i in order], [float(bounds[i]) for i in order]]
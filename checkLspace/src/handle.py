@@ -0,0 +1,86 @@
+"""
+Small picklable handles of SnapPy manifolds, to send them to the worker
+processes of the parallel modes (see parallel.py).
+
+A handle records a triangulation (an isosig, or the SnapPea file of a
+triangulation, which keeps the numbering of the tetrahedra and the
+peripheral curves), its Dehn fillings, the name and, optionally, the
+shapes of the tetrahedra of a solution of the gluing equations.  A handle
+made from a manifold records its own triangulation and its own solution
+(e.g. the one validated by is_hyperbolic), and every process rebuilding
+the manifold gets that same solution instead of solving the gluing
+equations again, which could give a different solution type.
+"""
+
+import snappy
+
+#The solution types (as enums of SnapPy) whose shapes are recorded by default: geometric and nongeometric
+recorded_solution_types = (1, 2)
+
+
+class ManifoldHandle(object):
+    """
+    >>> N = snappy.Manifold('m004(1,2)')
+    >>> H = ManifoldHandle.from_manifold(N)
+    >>> H.fillings
+    [(1, 2)]
+    >>> M = H.manifold()
+    >>> M.name(), M.solution_type()
+    ('m004', 'all tetrahedra positively oriented')
+    >>> max(abs(z - w) for z, w in zip(M.tetrahedra_shapes('rect'), N.tetrahedra_shapes('rect'))) < 1e-12
+    True
+    >>> abs(M.volume() - N.volume()) < 1e-9
+    True
+    >>> ManifoldHandle.from_dict(H.to_dict()) == H
+    True
+    """
+    def __init__(self, triangulation, fillings=None, name=None, shapes=None):
+        self.triangulation = triangulation
+        self.fillings = fillings
+        self.name = name
+        self.shapes = shapes
+
+    @staticmethod
+    def from_manifold(M, with_shapes=True, solution_types=recorded_solution_types):
+        fillings = [(int(m), int(l)) for m, l in M.cusp_info('filling')]
+        shapes = None
+        if with_shapes and int(M.solution_type(enum=True)) in solution_types:
+            shapes = [complex(z) for z in M.tetrahedra_shapes('rect')]
+        return ManifoldHandle(M._to_string(), fillings, M.name(), shapes)
+
+    def manifold(self):
+        M = snappy.Manifold(self.triangulation)
+        if self.fillings is not None:
+            if self.shapes is None:
+                M.dehn_fill(self.fillings)
+            else:
+                M.set_tetrahedra_shapes(self.shapes, None, self.fillings)
+        if self.name is not None:
+            M.set_name(self.name)
+        return M
+
+    def to_dict(self):
+        #A JSON-serializable version of the handle
+        ans = {'triangulation': self.triangulation, 'fillings': self.fillings, 'name': self.name, 'shapes': None}
+        if self.shapes is not None:
+            ans['shapes'] = [[z.real, z.imag] for z in self.shapes]
+        return ans
+
+    @staticmethod
+    def from_dict(data):
+        fillings = data['fillings']
+        if fillings is not None:
+            fillings = [tuple(c) for c in fillings]
+        shapes = data['shapes']
+        if shapes is not None:
+            shapes = [complex(x, y) for x, y in shapes]
+        return ManifoldHandle(data['triangulation'], fillings, data['name'], shapes)
+
+    def __eq__(self, other):
+        return isinstance(other, ManifoldHandle) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ManifoldHandle(%r, %r)' % (self.name, self.fillings)
@@ -0,0 +1,277 @@
+"""
+Evaluating the AND/OR branches of the proof tree of is_certified_L_space
+in separate processes.
+
+Each branch runs in its own forked process, so the arguments (SnapPy
+manifolds, TuraevTorsion objects, ...) do not need to be pickled. What a
+branch prints is captured and replayed by the parent in the order the
+serial algorithm would have printed it.
+
+Some arguments collect results in place (e.g. a Certificate). Such
+objects provide the methods child_state() and merge_child_state(state):
+the state of the copy in the child process is sent back and merged into
+the object of the parent when the branch is replayed.  The same is done
+for the objects in global_collectors, e.g. global counters, which are not
+arguments of the branches.
+
+In the serial evaluation a branch also sees what the branches before it
+added to such objects (e.g. the invariants of the manifolds already met,
+or the transposition table), while a forked branch only sees the objects
+as they were when it was started.  An object can then also provide the
+method invalidates(state, later_state), which tells if a branch with
+state later_state could have run differently had it seen the additions
+of an earlier branch with state state (e.g. because it looked for one of
+them and missed it).  Such a branch is evaluated again in the parent,
+after the earlier branches were merged, and so are the branches after
+it; hence the result and the printed proof path are the same as in the
+serial version.
+"""
+
+import io
+import sys
+import multiprocessing
+from multiprocessing.connection import wait
+
+_context = multiprocessing.get_context('fork')
+
+
+#Objects with the methods child_state() and merge_child_state(state) that every branch may update
+global_collectors = []
+
+
+def _collectors(kwargs):
+    ans = sorted((key, value) for key, value in kwargs.items() if hasattr(value, 'merge_child_state'))
+    return ans + [(None, value) for value in global_collectors]
+
+
+def _run_branch(conn, function, args, kwargs):
+    #This runs in the child process: we capture everything it prints and
+    #send it back to the parent together with the result (or the exception)
+    out = io.StringIO()
+    sys.stdout = out
+    try:
+        ans = (True, function(*args, **kwargs))
+    except Exception as e:
+        ans = (False, e)
+    sys.stdout = sys.__stdout__
+    states = [value.child_state() for key, value in _collectors(kwargs)]
+    try:
+        conn.send((ans, out.getvalue(), states))
+    except Exception as e:
+        #The result or the exception could not be pickled
+        conn.send(((False, Exception(repr(e))), out.getvalue(), []))
+    conn.close()
+
+
+def _invalidated(collectors, states, replayed):
+    #True if one of the branches already replayed, whose states are in replayed (keyed by the id of the collector),
+    #added something that could have changed the branch with the given collectors and states
+    for (key, collector), state in zip(collectors, states):
+        if hasattr(collector, 'invalidates'):
+            for earlier in replayed:
+                if id(collector) in earlier and collector.invalidates(earlier[id(collector)], state):
+                    return True
+    return False
+
+
+def _first_deciding(results, decisive, ordered=True):
+    #The index of the first finished branch which has the decisive value or (if ordered) raised an exception, or None
+    for i, result in enumerate(results):
+        if result is None:
+            continue
+        (ok, value) = result[0]
+        if (ordered and not ok) or (ok and bool(value) == decisive):
+            return i
+    return None
+
+
+def evaluate_in_parallel(branches, operator, ordered=True, max_processes=None):
+    """
+    Evaluates the boolean expression
+
+        branches[0] operator branches[1] operator ...
+
+    where operator is 'and' or 'or' and every branch is a triple
+    (function, args, kwargs), each branch in its own process.
+
+    When a branch decides the value of the expression (it is False for
+    'and', True for 'or', or it raises an exception) the branches after
+    it are terminated, but the branches before it are waited for, since
+    one of them could decide first in the serial evaluation.  The output
+    of the branches is then printed in serial order, up to the first
+    branch deciding the result, and exceptions raised by a branch are
+    re-raised when the serial evaluation would have reached them.  A
+    branch invalidated by the additions of the branches before it (see
+    above) is evaluated again in the parent process, together with all
+    the branches after it.  Hence the result and the output are the same
+    as in the serial evaluation.
+
+    With ordered=False, the first branch to finish with the decisive
+    value decides, and all the other branches are terminated (this is
+    how a portfolio of strategies is raced); a branch that raises an
+    exception or dies only counts as a non decisive value.  Only the
+    output and the collected states of the deciding branch are kept.  If max_processes is given,
+    at most that many branches run at the same time, and the others are
+    started in order as they finish.
+
+    >>> import time
+    >>> def branch(name, seconds, value):
+    ...     time.sleep(seconds)
+    ...     print(name)
+    ...     return value
+    >>> evaluate_in_parallel([(branch, ('a', 0.5, True), {}), (branch, ('b', 0, True), {})], 'or')
+    a
+    True
+    >>> evaluate_in_parallel([(branch, ('a', 0, False), {}), (branch, ('b', 0.2, True), {}),
+    ...                       (branch, ('c', 60, True), {})], 'or')
+    a
+    b
+    True
+    >>> evaluate_in_parallel([(branch, ('a', 0.2, True), {}), (branch, ('b', 0, False), {})], 'and')
+    a
+    b
+    False
+    >>> evaluate_in_parallel([(branch, ('a', 0, True), {}), (branch, ('b', 0, True), {})], 'and')
+    a
+    b
+    True
+    >>> evaluate_in_parallel([(branch, ('a', 60, True), {}), (branch, ('b', 0, True), {})], 'or', ordered=False)
+    b
+    True
+    >>> def fail():
+    ...     raise ValueError('no luck')
+    >>> evaluate_in_parallel([(fail, (), {}), (branch, ('b', 0, False), {}), (branch, ('c', 0.5, True), {})], 'or',
+    ...                      ordered=False)
+    c
+    True
+    >>> evaluate_in_parallel([(fail, (), {}), (branch, ('b', 0, False), {})], 'or', ordered=False)
+    False
+    >>> evaluate_in_parallel([(branch, (x, 0, x == 'c'), {}) for x in 'abcd'], 'or', max_processes=1)
+    a
+    b
+    c
+    True
+
+    Here the second branch looks for the name added by the first one, so
+    it is evaluated again after it, as in the serial evaluation:
+
+    >>> class Names(object):
+    ...     def __init__(self):
+    ...         self.names, self.added, self.missed = set(), [], []
+    ...     def add(self, name):
+    ...         self.names.add(name)
+    ...         self.added.append(name)
+    ...     def find(self, name):
+    ...         if name not in self.names:
+    ...             self.missed.append(name)
+    ...         return name in self.names
+    ...     def child_state(self):
+    ...         return (self.added, self.missed)
+    ...     def merge_child_state(self, state):
+    ...         self.names.update(state[0])
+    ...     def invalidates(self, state, later_state):
+    ...         return bool(set(state[0]) & set(later_state[1]))
+    >>> def search(name, names):
+    ...     print(name + (' found' if names.find(name) else ' not found'))
+    ...     names.add(name)
+    ...     return True
+    >>> names = Names()
+    >>> evaluate_in_parallel([(search, ('x',), {'names': names}), (search, ('x',), {'names': names})], 'and')
+    x not found
+    x found
+    True
+    """
+    assert operator in ['and', 'or']
+    decisive = (operator == 'or')
+
+    n = len(branches)
+    processes, connections = [None]*n, [None]*n
+    results = [None]*n
+    pending = []
+    next_branch = 0
+
+    def needed(i):
+        #Once a finished branch j decides the value, only the branches before it can change the result
+        j = _first_deciding(results, decisive, ordered)
+        return j is None or (ordered and i < j)
+
+    try:
+        while True:
+            for i in range(n):
+                if connections[i] in pending and not needed(i):
+                    pending.remove(connections[i])
+                    processes[i].terminate()
+            while next_branch < n and needed(next_branch) and (max_processes is None or len(pending) < max_processes):
+                function, args, kwargs = branches[next_branch]
+                receiver, sender = _context.Pipe(duplex=False)
+                P = _context.Process(target=_run_branch, args=(sender, function, args, kwargs))
+                P.start()
+                sender.close()
+                processes[next_branch], connections[next_branch] = P, receiver
+                pending.append(receiver)
+                next_branch += 1
+            if not pending:
+                break
+            for conn in wait(pending):
+                i = connections.index(conn)
+                try:
+                    results[i] = conn.recv()
+                except EOFError:
+                    #The process died without sending anything (e.g. it was killed)
+                    results[i] = ((False, Exception('A parallel branch died unexpectedly.')), '', [])
+                pending.remove(conn)
+    finally:
+        for P in processes:
+            if P is not None and P.is_alive():
+                P.terminate()
+        for P in processes:
+            if P is not None:
+                P.join()
+        for conn in connections:
+            if conn is not None:
+                conn.close()
+
+    if not ordered:
+        #Only the branch that decided is replayed
+        j = _first_deciding(results, decisive, ordered)
+        results = [result if i == j else None for i, result in enumerate(results)]
+
+    #We replay the branches in the order of the serial evaluation
+    replayed = []
+    serial = False
+    for (function, args, kwargs), result in zip(branches, results):
+        collectors = _collectors(kwargs)
+        if not serial and ordered and result is not None:
+            serial = _invalidated(collectors, result[2], replayed)
+        if serial:
+            #The earlier branches could have changed this one: we evaluate it here, after them
+            value = function(*args, **kwargs)
+        elif result is None:
+            #This branch was cancelled or not started
+            continue
+        else:
+            (ok, value), output, states = result
+            sys.stdout.write(output)
+            for (key, collector), state in zip(collectors, states):
+                collector.merge_child_state(state)
+            replayed.append(dict((id(collector), state) for (key, collector), state in zip(collectors, states)))
+            if not ok:
+                raise value
+        if bool(value) == decisive:
+            return value
+    return not decisive
+
+
+def map_in_parallel(function, arguments, processes):
+    """
+    Returns [function(x) for x in arguments], computed by a pool of forked
+    processes.  The function must be defined at the top level of a module
+    and its arguments and results must be picklable; SnapPy manifolds
+    can be sent as a ManifoldHandle (see handle.py).
+    """
+    pool = _context.Pool(processes)
+    try:
+        return pool.map(function, arguments, chunksize=max(1, len(arguments)//(4*processes)))
+    finally:
+        pool.terminate()
+        pool.join()
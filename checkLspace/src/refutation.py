@@ -0,0 +1,110 @@
+"""
+Fast refutations of the L-space property, used by is_certified_L_space
+to prune the branches of the proof tree that can not be certified.
+
+A closed manifold with a co-orientable taut foliation is not an L-space
+[Dun]; such foliations are searched for by the package foliar.  The
+search can take very long on some manifolds, hence it runs in a forked
+process which is killed after a time limit.  If foliar is not installed,
+nothing is ever refuted.  Since foliar imports regina, it is imported
+only when it is first needed.
+
+The fillings of a one-cusped manifold T can be refuted all at once: if a
+triangulation of T has a persistently foliar orientation, every filling
+of T except the one along its degeneracy slope has a taut foliation.
+"""
+
+import multiprocessing
+
+_context = multiprocessing.get_context('fork')
+
+
+def _foliar():
+    #The module foliar, or None if it is not installed
+    try:
+        import foliar
+    except ImportError:
+        return None
+    return foliar
+
+
+def _search_foliation(conn, M, rand_max, max_size):
+    #This runs in the child process
+    try:
+        ans = _foliar().first_foliation(M, rand_max, max_size) is not None
+    except Exception:
+        ans = False
+    conn.send(ans)
+    conn.close()
+
+
+def has_taut_foliation(M, time_limit=10, rand_max=5, max_size=25):
+    """
+    Returns True if foliar finds a taut foliation of the closed manifold M
+    within time_limit seconds, hence M is not an L-space.  The answer
+    False proves nothing.  The parameters rand_max and max_size are the
+    ones of foliar.first_foliation.
+    """
+    if _foliar() is None:
+        return False
+    receiver, sender = _context.Pipe(duplex=False)
+    P = _context.Process(target=_search_foliation, args=(sender, M, rand_max, max_size))
+    P.start()
+    sender.close()
+    try:
+        if not receiver.poll(time_limit):
+            return False
+        try:
+            return receiver.recv()
+        except EOFError:
+            #The process died, e.g. it ran out of memory
+            return False
+    finally:
+        if P.is_alive():
+            P.terminate()
+        P.join()
+        receiver.close()
+
+
+def _unoriented(slope):
+    #(p, q) and (-p, -q) are the same slope
+    p, q = slope
+    if q < 0 or (q == 0 and p < 0):
+        return (-p, -q)
+    return (p, q)
+
+
+def slopes_off_degeneracy(slopes, degeneracy_slopes):
+    """
+    The slopes among the given ones that differ from one of the
+    degeneracy slopes of some persistently foliar orientations, that is
+    the slopes whose fillings have a taut foliation.
+
+    >>> sorted(slopes_off_degeneracy([(1, 0), (0, 1), (1, 1), (-1, 0)], [(1, 0)]))
+    [(0, 1), (1, 1)]
+    >>> sorted(slopes_off_degeneracy([(1, 0), (0, 1)], [(1, 0), (0, 1)]))
+    [(0, 1), (1, 0)]
+    >>> slopes_off_degeneracy([(1, 0), (0, 1)], [])
+    set()
+    """
+    degeneracy = set(_unoriented(d) for d in degeneracy_slopes)
+    return set(tuple(s) for s in slopes if degeneracy - set([_unoriented(s)]))
+
+
+def persistent_non_L_slopes(T, slopes, tries=0):
+    """
+    Returns the set of the slopes among the given ones (in the coordinates
+    of the peripheral curves of the one-cusped manifold T) along which
+    the filling of T is not an L-space, as certified by the persistently
+    foliar orientations found by one search of foliar on T and on tries
+    random retriangulations of it.  If foliar is not installed or fails,
+    the set is empty.
+    """
+    foliar = _foliar()
+    if foliar is None:
+        return set()
+    try:
+        degeneracy_slopes, triangulations = foliar.degeneracy_slopes_with_search(T, tries)
+    except Exception:
+        return set()
+    return slopes_off_degeneracy(slopes, degeneracy_slopes)
@@ -0,0 +1,178 @@
+"""
+On-disk stores used to share results between runs of is_certified_L_space.
+
+The stores are small sqlite databases mapping strings (typically
+isometry signatures) to JSON values, so they survive across runs and can
+be used at the same time by several processes (e.g. the branches of the
+parallel mode, see parallel.py).
+"""
+
+import os
+import json
+import sqlite3
+
+
+class PersistentStore(object):
+    """
+    A dictionary from strings to JSON-serializable values, kept in an
+    sqlite database.
+
+    >>> import tempfile
+    >>> S = PersistentStore(os.path.join(tempfile.mkdtemp(), 'test.db'))
+    >>> S['m004(1,2)'] = {'value': 1}
+    >>> 'm004(1,2)' in S, 'm003' in S
+    (True, False)
+    >>> S['m004(1,2)']
+    {'value': 1}
+    >>> S.get('m003') is None
+    True
+    >>> len(S)
+    1
+    """
+    table = 'store'
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+        self._pid = None
+
+    def connection(self):
+        #An sqlite connection can not be shared with a forked process, hence we open a new one in each process
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection.execute('CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, value TEXT)' % self.table)
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key, default=None):
+        row = self.connection().execute('SELECT value FROM %s WHERE key=?' % self.table, (key,)).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def __getitem__(self, key):
+        ans = self.get(key)
+        if ans is None:
+            raise KeyError(key)
+        return ans
+
+    def __setitem__(self, key, value):
+        conn = self.connection()
+        conn.execute('INSERT OR REPLACE INTO %s (key, value) VALUES (?, ?)' % self.table, (key, json.dumps(value)))
+        conn.commit()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return self.connection().execute('SELECT COUNT(*) FROM %s' % self.table).fetchone()[0]
+
+    def keys(self):
+        return [row[0] for row in self.connection().execute('SELECT key FROM %s' % self.table)]
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.path)
+
+
+def isometry_signature(M, of_link=False):
+    #Returns the isometry signature of M, or None if SnapPy could not compute it. With of_link=True the signature
+    #includes the peripheral curves, hence it determines the coordinates of the slopes.
+    try:
+        return M.isometry_signature(of_link=of_link)
+    except Exception:
+        return None
+
+
+class LSpaceStore(PersistentStore):
+    """
+    The L-space values found by is_certified_L_space, keyed by isometry
+    signature: 1 for the certified L-spaces and -1 for the manifolds
+    identified in the census as non L-spaces or with a taut foliation (see
+    refutation.py). The answer False coming from the search itself is not
+    rigorous, hence it is never recorded.
+    """
+    table = 'L_space_values'
+
+    def lookup(self, M):
+        #Returns the recorded L-space value of M (1 or -1), or None if M is not in the store
+        key = isometry_signature(M)
+        if key is None:
+            return None
+        ans = self.get(key)
+        if ans is None:
+            return None
+        return ans['value']
+
+    def record(self, M, value, **info):
+        key = isometry_signature(M)
+        if key is not None:
+            assert value in [1, -1]
+            info.update(value=value, homology=str(M.homology()))
+            self[key] = info
+
+
+def as_L_space_store(store):
+    #The argument store of is_certified_L_space can be None, a path or an LSpaceStore
+    if store is None or isinstance(store, LSpaceStore):
+        return store
+    return LSpaceStore(store)
+
+
+class FillingCache(PersistentStore):
+    """
+    The evaluations of the Dehn fillings of the one-cusped manifolds met by
+    search_for_minimal_volume_fillings, keyed by the isometry signature of
+    the cusped manifold (with its peripheral curves) and the slope.  Each
+    value records whether the filling is hyperbolic, its solution type,
+    volume and homology, its census identification and the L-space value
+    of the latter, and the isosig of a triangulation with a good solution.
+    """
+    table = 'fillings'
+
+    @staticmethod
+    def key(signature, slope):
+        return '%s(%d,%d)' % (signature, slope[0], slope[1])
+
+    def lookup(self, signature, slope):
+        return self.get(FillingCache.key(signature, slope))
+
+    def record(self, signature, slope, value):
+        self[FillingCache.key(signature, slope)] = value
+
+
+def as_filling_cache(cache):
+    if cache is None or isinstance(cache, FillingCache):
+        return cache
+    return FillingCache(cache)
+
+
+class DrillingCache(PersistentStore):
+    """
+    The drillings of the closed manifolds met by is_certified_L_space,
+    keyed by the isometry signature of the manifold and the complex length
+    of the drilled geodesic (see curve_keys in check_if_is_L_space.py).
+    Each value records whether the curve could be drilled, the census
+    identification of the drilling and the resulting L-space value of the
+    manifold, or whether the drilling is hyperbolic, its solution type,
+    its volume and the isosig of a triangulation with a good solution,
+    together with the solution types accepted when it was evaluated (see
+    is_usable_drilling_record in check_if_is_L_space.py).
+    """
+    table = 'drillings'
+
+    @staticmethod
+    def key(signature, curve_key):
+        return '%s[%s]' % (signature, curve_key)
+
+    def lookup(self, signature, curve_key):
+        return self.get(DrillingCache.key(signature, curve_key))
+
+    def record(self, signature, curve_key, value):
+        self[DrillingCache.key(signature, curve_key)] = value
+
+
+def as_drilling_cache(cache):
+    if cache is None or isinstance(cache, DrillingCache):
+        return cache
+    return DrillingCache(cache)
@@ -0,0 +1,167 @@
+"""
+Timing the stages of is_certified_L_space (drilling, is_hyperbolic,
+identify, TuraevTorsion, the filling sweep, ...) at each node of the
+proof tree, that is for each value of init_string.
+
+Tracing is enabled by passing trace=Tracer() (or trace=Tracer(path), to
+also save the trace as JSON) to is_certified_L_space; a summary table is
+printed at the end of the run.  When tracing is disabled, stage() and the
+decorators below only check a global variable.
+
+The time of a stage includes the time of the stages nested in it, and
+the stage "node" is the total time spent at a node, including its
+children.
+"""
+
+import os
+import time
+import json
+import functools
+
+_tracer = None
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+_null_stage = _NullStage()
+
+
+class _Stage(object):
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.tracer.add(self.name, time.time() - self.start)
+        return False
+
+
+class Tracer(object):
+    """
+    The number of calls and the wall time of each stage, for each node of
+    the proof tree.
+
+    >>> T = Tracer()
+    >>> T.add('drill', 0.5, node='1')
+    >>> T.add('drill', 0.25, node='1')
+    >>> T.records
+    {'1': {'drill': [2, 0.75]}}
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.records = dict()
+        self.nodes = []
+        self._pid = os.getpid()
+
+    def _local_records(self):
+        #A forked process (see parallel.py) starts with no records, and sends back only its own ones
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.records = dict()
+        return self.records
+
+    def current_node(self):
+        return self.nodes[-1] if self.nodes else ''
+
+    def add(self, stage, seconds, node=None, calls=1):
+        if node is None:
+            node = self.current_node()
+        record = self._local_records().setdefault(node, dict()).setdefault(stage, [0, 0.0])
+        record[0] += calls
+        record[1] += seconds
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    #The following two methods are used by parallel.py to bring back the records of a child process
+    def child_state(self):
+        return self._local_records()
+
+    def merge_child_state(self, records):
+        for node, stages in records.items():
+            for stage, (calls, seconds) in stages.items():
+                self.add(stage, seconds, node=node, calls=calls)
+
+    def totals(self):
+        #The number of calls and the time of each stage, summed over all the nodes
+        ans = dict()
+        for stages in self.records.values():
+            for stage, (calls, seconds) in stages.items():
+                total = ans.setdefault(stage, [0, 0.0])
+                total[0] += calls
+                total[1] += seconds
+        return ans
+
+    def summary(self):
+        lines = ['%-20s %8s %12s' % ('stage', 'calls', 'seconds')]
+        for stage, (calls, seconds) in sorted(self.totals().items(), key=lambda x: -x[1][1]):
+            lines.append('%-20s %8d %12.3f' % (stage, calls, seconds))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        return json.dumps({'records': self.records, 'totals': self.totals()})
+
+    def save(self, path=None):
+        with open(self.path if path is None else path, 'w') as file:
+            file.write(self.to_json())
+
+    def __repr__(self):
+        return 'Tracer(%d nodes)' % len(self.records)
+
+
+def stage(name):
+    #Use as "with stage('drill'): ..."
+    if _tracer is None:
+        return _null_stage
+    return _tracer.stage(name)
+
+
+def timed(name):
+    #A decorator recording the calls of a function as the stage name
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _tracer.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_node(function):
+    """
+    The decorator of is_certified_L_space: starts the tracing if the
+    argument trace is a Tracer, and records the calls under the node
+    init_string.  At the end of the outermost call, the summary is
+    printed and the trace is saved.
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        global _tracer
+        trace = kwargs.get('trace')
+        if trace is None:
+            return function(*args, **kwargs)
+        outermost = _tracer is None
+        _tracer = trace
+        trace.nodes.append(kwargs.get('init_string', ''))
+        try:
+            with trace.stage('node'):
+                return function(*args, **kwargs)
+        finally:
+            trace.nodes.pop()
+            if outermost:
+                _tracer = None
+                print(trace.summary())
+                if trace.path is not None:
+                    trace.save()
+    return wrapper
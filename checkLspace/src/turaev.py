@@ -17,8 +17,9 @@ issue of needing Heegaard to check realizability.
 
 import snappy
 import heegaard
-from sage.all import (ZZ, QQ, AbelianGroup, GroupAlgebra,
-                      LaurentPolynomialRing, cartesian_product_iterator,
+from sage.all import (ZZ, QQ, GF, AbelianGroup, GroupAlgebra,
+                      LaurentPolynomialRing, PolynomialRing,
+                      cartesian_product_iterator, CRT_list, is_prime, prod,
                       gcd, xgcd, lcm, floor, vector, matrix, infinity)
 from snappy.snap.nsagetools import (MapToAbelianization,
                                     MapToGroupRingOfAbelianization,
@@ -506,6 +507,173 @@ class MapToPolynomialRingOfAbelianization(MapToAbelianization):
             ans += c*RH.monomial(H(e))
         return ans
     
+
+# Computing the determinant of the matrix of Fox derivatives.  Over the
+# Laurent polynomial ring of psi_fake, A.det() is a generic multivariate
+# determinant, which dominates the time of TuraevTorsion for larger
+# presentations.  Instead, we compute its image in Z[H] = Z[T][t, t^-1]
+# modulo several primes p = 1 mod N, where N is the exponent of the
+# torsion subgroup T.  For each character chi of T with values in
+# GF(p), det(chi(A)) is a univariate polynomial in t, found by
+# evaluation and interpolation; the coefficients in Z[T] are recovered
+# by the inverse Fourier transform on T, and then by the CRT.
+
+def fox_matrix(relators, generators, psi_fake):
+    return matrix(psi_fake.R,
+                  [[fox_derivative(R, psi_fake, g) for R in relators] for g in generators])
+
+def fox_matrix_terms(A, psi_fake):
+    """
+    The entries of A as lists of triples (c, e, f), one for each term
+    c*u^e*t^f, where the exponents e of the torsion generators are
+    reduced modulo their orders.
+    """
+    one_gen = psi_fake.R.ngens() == 1
+    rows = []
+    for i in range(A.nrows()):
+        row = []
+        for j in range(A.ncols()):
+            entry = []
+            if A[i, j] != 0:
+                for c, e in zip(A[i, j].coefficients(), A[i, j].exponents()):
+                    if one_gen:
+                        e = [e]
+                    e = psi_fake._normalize_exponents(list(e))
+                    entry.append((ZZ(c), tuple(e[:-1]), e[-1]))
+            row.append(entry)
+        rows.append(row)
+    return rows
+
+def determinant_bound(rows):
+    """
+    A bound on the absolute values of the coefficients of the
+    determinant: the l^1 norm of the determinant is at most the product
+    of the l^1 norms of the rows, and the same holds for the columns.
+    """
+    def norm(entries):
+        return sum(abs(c) for entry in entries for c, e, f in entry)
+    row_bound = prod(norm(row) for row in rows)
+    col_bound = prod(norm([row[j] for row in rows]) for j in range(len(rows)))
+    return min(row_bound, col_bound)
+
+def primes_one_mod(N, lower):
+    """
+    The primes p = 1 mod N larger than lower, in increasing order.
+
+    >>> P = primes_one_mod(6, 100)
+    >>> [next(P) for i in range(3)]
+    [103, 109, 127]
+    """
+    k = lower//N + 1
+    while True:
+        if is_prime(N*k + 1):
+            yield N*k + 1
+        k += 1
+
+def modular_fox_determinant(rows, orders, p):
+    """
+    The image of the determinant in Z[T][t, t^-1] modulo the prime p,
+    where T is the product of the cyclic groups of the given orders and
+    p = 1 mod their lcm.  Returns a dictionary from the pairs (a, j) to
+    the nonzero coefficients of u^a t^j in GF(p).
+    """
+    F = GF(p)
+    N = lcm(orders) if orders else 1
+    omega = F.zeta(N)
+    roots = [omega**(N//n) for n in orders]
+    if orders:
+        chars = [tuple(k) for k in cartesian_product_iterator([range(n) for n in orders])]
+    else:
+        chars = [()]
+
+    # After multiplying each row by a power of t, the entries are
+    # polynomials and the determinant has degree at most the following
+    lows, degree = [], 0
+    for row in rows:
+        degs = [f for entry in row for c, e, f in entry]
+        if len(degs) == 0:
+            return dict()
+        lows.append(min(degs))
+        degree += max(degs) - min(degs)
+    points = [F(x) for x in range(degree + 1)]
+    Ft = PolynomialRing(F, 't')
+
+    values = []
+    for k in chars:
+        z = [r**i for r, i in zip(roots, k)]
+        entries = [[[(F(c)*prod(x**i for x, i in zip(z, e)), f - low) for c, e, f in entry]
+                    for entry in row] for row, low in zip(rows, lows)]
+        dets = []
+        for x in points:
+            powers = [x**i for i in range(degree + 1)]
+            B = matrix(F, [[sum(c*powers[f] for c, f in entry) for entry in row] for row in entries])
+            dets.append(B.det())
+        values.append(Ft.lagrange_polynomial(list(zip(points, dets))).padded_list(degree + 1))
+
+    # The inverse Fourier transform on T
+    ans = dict()
+    size = F(len(chars))
+    shift = sum(lows)
+    for a in chars:
+        weights = [prod(r**(-i*l) for r, i, l in zip(roots, a, k)) for k in chars]
+        for j in range(degree + 1):
+            c = sum(v[j]*w for v, w in zip(values, weights))/size
+            if c != 0:
+                ans[(a, j + shift)] = c
+    return ans
+
+def fox_determinant(A, psi_fake, extra_primes=1):
+    """
+    Returns psi_fake.convert_to_group_ring(A.det()) for a square matrix
+    A over psi_fake.R, computed modulo enough primes to recover it by
+    the CRT from determinant_bound.  The result is checked with
+    extra_primes more primes.
+
+    >>> for name in ['m016', 'm043', 'm179']:
+    ...     G = realizable_presentation(snappy.Manifold(name))
+    ...     psi_fake = MapToPolynomialRingOfAbelianization(G)
+    ...     A = fox_matrix(G.relators() + [G.peripheral_curves()[0][0]], G.generators(), psi_fake)
+    ...     print(fox_determinant(A, psi_fake) == psi_fake.convert_to_group_ring(A.det()))
+    True
+    True
+    True
+    """
+    D = psi_fake.elementary_divisors
+    assert D[-1] == 0 and 0 not in D[:-1]
+    orders = [ZZ(n) for n in D[:-1]]
+    rows = fox_matrix_terms(A, psi_fake)
+    bound = determinant_bound(rows)
+    primes = primes_one_mod(lcm(orders) if orders else 1, 2**30)
+
+    moduli, residues = [], []
+    while prod(moduli) <= 2*bound:
+        p = next(primes)
+        moduli.append(p)
+        residues.append(modular_fox_determinant(rows, orders, p))
+    keys = set().union(*residues)
+    modulus = prod(moduli)
+    ans = dict()
+    for key in keys:
+        c = CRT_list([ZZ(r.get(key, 0)) for r in residues], moduli)
+        if c > modulus//2:
+            c -= modulus
+        if c != 0:
+            ans[key] = c
+
+    # The coefficients found modulo the extra primes must agree
+    for i in range(extra_primes):
+        p = next(primes)
+        check = modular_fox_determinant(rows, orders, p)
+        assert set(check) == {key for key, c in ans.items() if c % p != 0}
+        assert all(check[key] == c for key, c in ans.items() if key in check)
+
+    H, RH = psi_fake.H, psi_fake.group_ring
+    d = RH(0)
+    for (a, j), c in ans.items():
+        e = tuple(psi_fake._normalize_exponents(list(a) + [j]))
+        d += c*RH.monomial(H(e))
+    return d
+
 class TuraevTorsion(object):
     """
     As normalized in [RR], the Turaev torsion tau for a rational
@@ -525,8 +693,15 @@ class TuraevTorsion(object):
 
     >>> M = snappy.Manifold('m003')
     >>> tau = TuraevTorsion(M)
+
+    By default, the determinant of the matrix of Fox derivatives is
+    computed by fox_determinant; with engine='symbolic' it is computed
+    in the Laurent polynomial ring, which gives the same torsion.
+
+    >>> tau.tau == TuraevTorsion(M, engine='symbolic').tau
+    True
     """
-    def __init__(self, manifold):
+    def __init__(self, manifold, engine='modular'):
         self.manifold = M = manifold
         self.group = G = realizable_presentation(manifold)
 
@@ -552,9 +727,11 @@ class TuraevTorsion(object):
         rels = G.relators() + [m_word]
         gens = G.generators()
         psi_fake = MapToPolynomialRingOfAbelianization(G)
-        A = matrix(psi_fake.R,
-                   [[fox_derivative(R, psi_fake, g) for R in rels] for g in gens])
-        d = psi_fake.convert_to_group_ring(A.det())
+        A = fox_matrix(rels, gens, psi_fake)
+        if engine == 'modular':
+            d = fox_determinant(A, psi_fake)
+        else:
+            d = psi_fake.convert_to_group_ring(A.det())
         if sum(d.coefficients()) < 0:
             d = -d
         d = t**(-t_deg_min(d))*d
@@ -671,6 +848,23 @@ def time_test():
     for M in manifolds:
         TuraevTorsion(M)
 
+def check_fox_determinant(n=100):
+    """
+    Compares the torsions computed with the two engines on random
+    manifolds of the census, and returns the names of those where they
+    differ.
+
+    >>> check_fox_determinant(10)
+    []
+    """
+    census = snappy.OrientableCuspedCensus(betti=1, cusps=1)
+    ans = []
+    for i in range(n):
+        M = census.random()
+        if TuraevTorsion(M).tau != TuraevTorsion(M, engine='symbolic').tau:
+            ans.append(M.name())
+    return ans
+
         
 
 if __name__ == '__main__':